@@ -0,0 +1,445 @@
+"""
+Benchmarks for the NPS gateway views against a local stub gateway.
+
+    cd nps_payment_gateways
+    python benchmarks/run.py                                   # every scenario
+    python benchmarks/run.py -s service_charge_cached -n 2000 -t 8
+    python benchmarks/run.py --latency 0.05 --instruments 500
+    python benchmarks/run.py --save benchmarks/baselines/local.json
+    python benchmarks/run.py --compare benchmarks/baselines/local.json
+
+Each scenario sends requests to one view through DRF's request factory, so the
+numbers cover the view, its serializers, caches, ledger writes, signing and the
+pooled HTTP client, but not Django's middleware. The stub gateway runs in its
+own process. Allocations are measured in a separate single-threaded pass under
+tracemalloc, which is too slow to leave on while timing.
+
+--compare exits with status 1 when any scenario's throughput, p99 latency or
+allocations are worse than the baseline by more than --tolerance.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCHMARKS_DIR, os.path.dirname(BENCHMARKS_DIR)]
+
+import stub_gateway  # noqa: E402
+
+MERCHANT = {
+    'merchant_id': '7467',
+    'merchant_name': 'benchmark',
+    'api_username': 'benchmark',
+    'api_password': 'benchmark',
+    'gateway_api_secret_key': 'benchmark-secret',
+}
+
+# Merchant whose ledger rows the export scenarios stream
+EXPORT_MERCHANT_ID = 'BENCHEXPORT'
+
+
+class Scenario:
+    """
+    One benchmarked view: how to build its requests and which settings to run it under.
+
+    actions maps methods to viewset actions, view_kwargs are passed to the view
+    like URL arguments and setup() runs once before the scenario, e.g. to seed rows.
+    staff sends the requests as a staff user, for the views limited to them.
+    """
+
+    def __init__(self, name, view, method, path, make_data, settings=None, actions=None, view_kwargs=None, setup=None,
+                 staff=False):
+        self.name = name
+        self.view = view
+        self.method = method
+        self.path = path
+        self.make_data = make_data
+        self.settings = settings or {}
+        self.actions = actions
+        self.view_kwargs = view_kwargs or {}
+        self.setup = setup
+        self.staff = staff
+
+
+def build_scenarios():
+    from nps_payment_gateways import views
+    from nps_payment_gateways.models import NpsPayment
+
+    txn_ids = itertools.count()
+    amounts = ['100.00', '250.00', '1000.00', '4999.50']
+
+    def unique_txn():
+        return f"BENCH{next(txn_ids):08d}"
+
+    def service_charge():
+        return {'amount': amounts[next(txn_ids) % len(amounts)], 'payment_instrument_id': 'BANK0'}
+
+    def service_charge_batch():
+        return {'items': [{'amount': amount, 'payment_instrument_id': f'BANK{i}'} for i in range(5) for amount in amounts]}
+
+    def process_id():
+        return {'amount': '100.00', 'merchant_txn_id': unique_txn(), 'TransactionRemarks': 'benchmark', 'InstrumentCode': 'BANK0'}
+
+    repeated_process_id = {'amount': '100.00', 'merchant_txn_id': 'BENCHREPEAT', 'TransactionRemarks': 'benchmark', 'InstrumentCode': 'BANK0'}
+
+    return [
+        Scenario('payment_instruments_cached', views.PaymentInstrumentView, 'post', '/payment-instruments/', dict),
+        Scenario('payment_instruments_uncached', views.PaymentInstrumentView, 'post', '/payment-instruments/', dict,
+                 settings={'NPS_INSTRUMENT_CACHE_TTL': 0}),
+        Scenario('service_charge_cached', views.ServiceChargeView, 'post', '/service-charge/', service_charge),
+        Scenario('service_charge_uncached', views.ServiceChargeView, 'post', '/service-charge/', service_charge,
+                 settings={'NPS_SERVICE_CHARGE_CACHE_TTL': 0, 'NPS_SERVICE_CHARGE_LOCAL_COMPUTE': False}),
+        Scenario('service_charge_batch_cached', views.BatchServiceChargeView, 'post', '/service-charge/batch/', service_charge_batch),
+        Scenario('service_charge_batch_uncached', views.BatchServiceChargeView, 'post', '/service-charge/batch/', service_charge_batch,
+                 settings={'NPS_SERVICE_CHARGE_CACHE_TTL': 0, 'NPS_SERVICE_CHARGE_LOCAL_COMPUTE': False}),
+        Scenario('process_id', views.ProcessIdView, 'post', '/process-id/', process_id),
+        Scenario('process_id_repeated', views.ProcessIdView, 'post', '/process-id/', lambda: repeated_process_id),
+        Scenario('notification', views.NotificationView, 'post', '/notification/',
+                 lambda: {'merchant_txn_id': unique_txn(), 'gateway_txn_id': 'GW1'},
+                 settings={'NPS_NOTIFICATION_MODE': 'sync'}),
+        Scenario('transaction_status_gateway', views.TransactionStatusView, 'post', '/transaction-status/',
+                 lambda: {'merchant_txn_id': f"PENDING{next(txn_ids):08d}"}),
+        Scenario('transaction_status_ledger', views.TransactionStatusView, 'post', '/transaction-status/',
+                 lambda: {'merchant_txn_id': 'BENCHSETTLED'}),
+        Scenario('transaction_status_bulk_gateway', views.BulkTransactionStatusView, 'post', '/transaction-status/bulk/',
+                 lambda: {'merchant_txn_ids': [f"PENDING{next(txn_ids):08d}" for _ in range(20)]},
+                 settings={'NPS_BULK_STATUS_RATE': 0}, staff=True),
+        Scenario('transaction_status_bulk_ledger', views.BulkTransactionStatusView, 'post', '/transaction-status/bulk/',
+                 lambda: {'merchant_txn_ids': [f"BENCHSETTLED{i:02d}" for i in range(20)]},
+                 settings={'NPS_BULK_STATUS_RATE': 0}, staff=True),
+        Scenario('export_transactions_ndjson', views.ExportView, 'get', '/export/transactions/',
+                 lambda: {'merchant_id': EXPORT_MERCHANT_ID}, view_kwargs={'name': 'transactions'}, setup=seed_export_rows,
+                 staff=True),
+        Scenario('export_transactions_csv', views.ExportView, 'get', '/export/transactions/',
+                 lambda: {'merchant_id': EXPORT_MERCHANT_ID, 'export_format': 'csv'}, view_kwargs={'name': 'transactions'},
+                 setup=seed_export_rows, staff=True),
+        Scenario('gateway_status', views.GatewayStatusView, 'get', '/gateway-status/', dict),
+        Scenario('metrics', views.MetricsView, 'get', '/metrics/', dict, settings={'NPS_METRICS_ENABLED': True}),
+        Scenario('npspayment_list', views.NpsPaymentViewSet, 'get', '/npspayment/', dict, actions={'get': 'list'}),
+        Scenario('npspayment_retrieve', views.NpsPaymentViewSet, 'get', '/npspayment/', dict, actions={'get': 'retrieve'},
+                 view_kwargs={'pk': NpsPayment.objects.get(merchant_id=MERCHANT['merchant_id']).pk}),
+    ] + build_async_scenarios(service_charge, process_id)
+
+
+def seed_export_rows(count=2000):
+    """
+    Store count settled transactions under their own merchant_id, so other scenarios do not change the export size
+    """
+    from nps_payment_gateways.models import NpsTransaction
+
+    if NpsTransaction.objects.filter(merchant_id=EXPORT_MERCHANT_ID).exists():
+        return
+    NpsTransaction.objects.bulk_create(
+        NpsTransaction(
+            merchant_id=EXPORT_MERCHANT_ID,
+            merchant_txn_id=f"EXPORT{i:08d}",
+            process_id=f"PID-EXPORT{i:08d}",
+            amount='100.00',
+            status=NpsTransaction.STATUS_SUCCESS,
+            status_response={"code": "0", "message": "Success", "data": {"MerchantTxnId": f"EXPORT{i:08d}", "Status": "Success"}},
+        )
+        for i in range(count)
+    )
+
+
+def build_async_scenarios(service_charge, process_id):
+    """
+    The async views, each request run to completion on an event loop kept per thread; none without adrf
+    """
+    try:
+        from nps_payment_gateways import async_views
+    except ImportError:
+        return []
+
+    return [
+        Scenario('async_payment_instruments_cached', async_views.AsyncPaymentInstrumentView, 'post', '/payment-instruments/', dict),
+        Scenario('async_service_charge_uncached', async_views.AsyncServiceChargeView, 'post', '/service-charge/', service_charge,
+                 settings={'NPS_SERVICE_CHARGE_CACHE_TTL': 0, 'NPS_SERVICE_CHARGE_LOCAL_COMPUTE': False}),
+        Scenario('async_process_id', async_views.AsyncProcessIdView, 'post', '/process-id/', process_id),
+    ]
+
+
+def setup_django(gateway_url, database, metrics=False):
+    import django
+    from django.conf import settings
+
+    database_options = {'timeout': 30}
+    if django.VERSION >= (5, 1):
+        # Take the write lock up front so concurrent ledger writes queue instead of failing with "database is locked"
+        database_options['transaction_mode'] = 'IMMEDIATE'
+    settings.configure(
+        SECRET_KEY='benchmark',
+        DEBUG=False,
+        USE_TZ=True,
+        ALLOWED_HOSTS=['*'],
+        INSTALLED_APPS=['django.contrib.contenttypes', 'django.contrib.auth', 'rest_framework', 'nps_payment_gateways'],
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': database, 'OPTIONS': database_options}},
+        ROOT_URLCONF='nps_payment_gateways.urls',
+        NPS_BASE_URL=gateway_url,
+        NPS_METRICS_ENABLED=metrics,
+    )
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from nps_payment_gateways.models import NpsPayment
+
+    call_command('migrate', verbosity=0)
+    NpsPayment.objects.create(**MERCHANT)
+    User.objects.create_user('benchmark', is_staff=True)
+
+
+def reset_state():
+    from nps_payment_gateways.cache import config_cache, invalidate_payment_instruments
+    from nps_payment_gateways.charges import service_charge_cache
+    from nps_payment_gateways.client import reset_gateway_client
+    from nps_payment_gateways.resilience import reset_breakers
+    from nps_payment_gateways.signing import clear_signers
+
+    config_cache.invalidate()
+    clear_signers()
+    invalidate_payment_instruments()
+    service_charge_cache.invalidate()
+    reset_breakers()
+    reset_gateway_client()
+
+
+def make_caller(scenario):
+    from django.contrib.auth.models import User
+    from django.db import close_old_connections
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    factory = APIRequestFactory()
+    user = User.objects.get(username='benchmark') if scenario.staff else None
+    view = scenario.view.as_view(scenario.actions) if scenario.actions else scenario.view.as_view()
+    loops = threading.local()
+
+    def respond(request):
+        if not scenario.view.view_is_async:
+            return view(request, **scenario.view_kwargs)
+        loop = getattr(loops, 'loop', None)
+        if loop is None:
+            # One loop per thread, so the async client keeps its connection pool between requests
+            loop = loops.loop = asyncio.new_event_loop()
+        return loop.run_until_complete(view(request, **scenario.view_kwargs))
+
+    def call():
+        if scenario.method == 'get':
+            request = factory.get(scenario.path, scenario.make_data())
+        else:
+            request = factory.post(scenario.path, scenario.make_data(), format='json')
+        if user is not None:
+            force_authenticate(request, user=user)
+        response = respond(request)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        elif hasattr(response, 'render'):
+            response.render()
+        close_old_connections()
+        return response.status_code
+    return call
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def time_requests(call, requests, threads):
+    def worker(count):
+        from django.db import connection
+
+        timings, errors = [], 0
+        for _ in range(count):
+            start = time.perf_counter()
+            status_code = call()
+            timings.append(time.perf_counter() - start)
+            errors += status_code >= 400
+        connection.close()
+        return timings, errors
+
+    shares = [requests // threads + (i < requests % threads) for i in range(threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(worker, shares))
+    elapsed = time.perf_counter() - started
+
+    timings = sorted(t for result in results for t in result[0])
+    return {
+        'requests': requests,
+        'threads': threads,
+        'errors': sum(result[1] for result in results),
+        'seconds': round(elapsed, 4),
+        'rps': round(requests / elapsed, 1),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+    }
+
+
+def measure_allocations(call, requests):
+    """
+    Return the mean peak of traced memory per request in KiB, and the KiB still held afterwards
+    """
+    tracemalloc.start()
+    try:
+        held_before = tracemalloc.get_traced_memory()[0]
+        peaks = 0
+        for _ in range(requests):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            call()
+            peaks += tracemalloc.get_traced_memory()[1] - current
+        held_after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return {
+        'alloc_peak_kib': round(peaks / requests / 1024, 2),
+        'retained_kib': round((held_after - held_before) / 1024, 2),
+    }
+
+
+def run_scenario(scenario, options):
+    from django.test import override_settings
+
+    with override_settings(**scenario.settings):
+        reset_state()
+        if scenario.setup is not None:
+            scenario.setup()
+        call = make_caller(scenario)
+        for _ in range(options.warmup):
+            call()
+        result = time_requests(call, options.requests, options.threads)
+        if options.alloc_requests:
+            result.update(measure_allocations(call, options.alloc_requests))
+    return result
+
+
+def print_results(results):
+    columns = ['rps', 'mean_ms', 'p50_ms', 'p99_ms', 'alloc_peak_kib', 'errors']
+    width = max(len(name) for name in results)
+    print(f"{'scenario':<{width}}  " + "  ".join(f"{column:>14}" for column in columns))
+    for name, result in results.items():
+        print(f"{name:<{width}}  " + "  ".join(f"{result.get(column, '-'):>14}" for column in columns))
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print the change against a saved baseline and return the names of regressed scenarios
+    """
+    # Metric name and whether a larger value is better
+    metrics = [('rps', True), ('p50_ms', False), ('p99_ms', False), ('alloc_peak_kib', False)]
+    regressed = []
+    width = max(len(name) for name in results)
+    print(f"\nCompared with {baseline['meta']['saved_at']} (tolerance {tolerance:.0%}):")
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f"{name:<{width}}  no baseline")
+            continue
+        changes, worse = [], False
+        for metric, higher_is_better in metrics:
+            if not before.get(metric) or metric not in result:
+                continue
+            change = (result[metric] - before[metric]) / before[metric]
+            changes.append(f"{metric} {change:+.1%}")
+            # p50 is reported but too noisy on its own to fail a comparison
+            if metric != 'p50_ms' and (-change if higher_is_better else change) > tolerance:
+                worse = True
+        if worse:
+            regressed.append(name)
+        print(f"{name:<{width}}  " + ", ".join(changes) + ("  REGRESSED" if worse else ""))
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NPS gateway views against a local stub gateway.")
+    parser.add_argument('-s', '--scenario', action='append', help="scenario to run, may be repeated; default is all")
+    parser.add_argument('-n', '--requests', type=int, default=500, help="timed requests per scenario")
+    parser.add_argument('-t', '--threads', type=int, default=1, help="concurrent request threads")
+    parser.add_argument('--warmup', type=int, default=20, help="untimed requests before each scenario")
+    parser.add_argument('--alloc-requests', type=int, default=100, help="requests traced for allocations, 0 skips the pass")
+    parser.add_argument('--latency', type=float, default=0.0, help="stub gateway seconds per reply")
+    parser.add_argument('--jitter', type=float, default=0.0, help="stub gateway extra random seconds per reply")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of stub replies that are HTTP 503")
+    parser.add_argument('--gateway-error-rate', type=float, default=0.0, help="share of stub replies with a code 1 error")
+    parser.add_argument('--instruments', type=int, default=50, help="payment instruments in the stub's list")
+    parser.add_argument('--metrics', action='store_true', help="run with NPS_METRICS_ENABLED to measure its overhead")
+    parser.add_argument('--save', metavar='FILE', help="write the results as a JSON baseline")
+    parser.add_argument('--compare', metavar='FILE', help="compare the results with a JSON baseline")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="allowed relative regression for --compare")
+    parser.add_argument('--list', action='store_true', help="list the scenarios and exit")
+    options = parser.parse_args()
+
+    stub_options = {
+        'latency': options.latency,
+        'jitter': options.jitter,
+        'error_rate': options.error_rate,
+        'gateway_error_rate': options.gateway_error_rate,
+        'instruments': options.instruments,
+    }
+    ready = multiprocessing.Queue()
+    stub = multiprocessing.Process(target=stub_gateway.serve, args=(ready,), kwargs=stub_options, daemon=True)
+    stub.start()
+    workdir = tempfile.mkdtemp(prefix='nps-benchmarks-')
+    try:
+        setup_django(ready.get(timeout=10), os.path.join(workdir, 'db.sqlite3'), options.metrics)
+        scenarios = build_scenarios()
+        if options.list:
+            for scenario in scenarios:
+                print(scenario.name)
+            return 0
+        if options.scenario:
+            unknown = set(options.scenario) - {scenario.name for scenario in scenarios}
+            if unknown:
+                parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+            scenarios = [scenario for scenario in scenarios if scenario.name in options.scenario]
+
+        results = {}
+        for scenario in scenarios:
+            results[scenario.name] = run_scenario(scenario, options)
+        print_results(results)
+
+        if options.save:
+            import django
+
+            baseline = {
+                'meta': {
+                    'saved_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'machine': platform.machine(),
+                    'options': {key: value for key, value in vars(options).items() if key not in ('save', 'compare', 'list')},
+                },
+                'results': results,
+            }
+            with open(options.save, 'w') as f:
+                json.dump(baseline, f, indent=2)
+                f.write('\n')
+            print(f"\nBaseline saved to {options.save}")
+
+        if options.compare:
+            with open(options.compare) as f:
+                regressed = compare(results, json.load(f), options.tolerance)
+            if regressed:
+                return 1
+        return 0
+    finally:
+        stub.terminate()
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Local stand-in for the NPS gateway, used by the benchmarks.
+
+Answers the four gateway endpoints with canned, correctly shaped responses.
+Latency, error rates and the size of the instrument list are configurable.
+CheckTransactionStatus reports Pending for MerchantTxnIds starting with
+"PENDING", Fail for ones starting with "FAIL" and Success otherwise.
+
+Run it on its own to point a development server at it:
+
+    python benchmarks/stub_gateway.py --port 8765 --latency 0.05 --instruments 200
+    NPS_BASE_URL = 'http://127.0.0.1:8765'
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHARGE_PERCENT = Decimal('1.5')
+
+
+def _success(data):
+    return {"code": "0", "message": "Success", "errors": [], "data": data}
+
+
+def payment_instruments(count):
+    return _success([
+        {
+            "InstitutionName": f"Bank {i}",
+            "InstrumentName": f"Bank {i} Internet Banking",
+            "InstrumentCode": f"BANK{i}",
+            "InstrumentValue": None,
+            "LogoUrl": f"https://apisandbox.nepalpayment.com/UploadedImages/PaymentInstitution/bank{i}.png",
+            "BankUrl": f"https://bank{i}.example.com",
+            "BankType": "EBanking",
+        }
+        for i in range(count)
+    ])
+
+
+def service_charge(amount):
+    total = (Decimal(amount) * CHARGE_PERCENT / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return _success({
+        "Amount": amount,
+        "CommissionType": "Percentage",
+        "ChargeValue": str(CHARGE_PERCENT),
+        "TotalChargeAmount": str(total),
+    })
+
+
+def process_id(merchant_txn_id):
+    return _success({"ProcessId": f"PID-{merchant_txn_id}"})
+
+
+def transaction_status(merchant_txn_id):
+    if merchant_txn_id.startswith('PENDING'):
+        status = 'Pending'
+    elif merchant_txn_id.startswith('FAIL'):
+        status = 'Fail'
+    else:
+        status = 'Success'
+    return _success({
+        "GatewayReferenceNo": f"REF-{merchant_txn_id}",
+        "Amount": "100",
+        "ServiceCharge": "1.5",
+        "TransactionRemarks": "benchmark",
+        "ProcessId": f"PID-{merchant_txn_id}",
+        "TransactionDate": "2026-01-01 10:00:00",
+        "MerchantTxnId": merchant_txn_id,
+        "CbsMessage": "",
+        "Status": status,
+        "Institution": "Bank 0",
+        "Instrument": "Bank 0 Internet Banking",
+    })
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this each reply waits on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        status_code, reply = self.server.gateway.respond(self.path.strip('/'), json.loads(body or b'{}'))
+        payload = json.dumps(reply).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 256
+
+
+class StubGateway:
+    """
+    Threaded HTTP server imitating the NPS gateway on localhost.
+
+    latency and jitter are seconds added to every reply. error_rate is the share
+    of calls answered with HTTP 503, gateway_error_rate the share answered with
+    a code "1" error body.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 gateway_error_rate=0.0, instruments=10):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.gateway_error_rate = gateway_error_rate
+        self.instruments = payment_instruments(instruments)
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.gateway = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def respond(self, endpoint, body):
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        if self.error_rate and random.random() < self.error_rate:
+            return 503, {"message": "Service Unavailable"}
+        if self.gateway_error_rate and random.random() < self.gateway_error_rate:
+            return 200, {"code": "1", "message": "Error", "errors": [{"error_code": "1", "error_message": "Stub gateway error"}]}
+
+        if endpoint == 'GetPaymentInstrumentDetails':
+            return 200, self.instruments
+        if endpoint == 'GetServiceCharge':
+            return 200, service_charge(body.get('Amount', '0'))
+        if endpoint == 'GetProcessId':
+            return 200, process_id(body.get('MerchantTxnId', ''))
+        if endpoint == 'CheckTransactionStatus':
+            return 200, transaction_status(body.get('MerchantTxnId', ''))
+        return 404, {"message": "Not Found"}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='nps-stub-gateway', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def serve(ready, **options):
+    """
+    Process entry point: start a gateway and report its URL through the ready queue
+    """
+    gateway = StubGateway(**options)
+    ready.put(gateway.url)
+    gateway.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stub NPS gateway.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every reply")
+    parser.add_argument('--jitter', type=float, default=0.0, help="up to this many extra random seconds per reply")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of calls answered with HTTP 503")
+    parser.add_argument('--gateway-error-rate', type=float, default=0.0, help="share of calls answered with a code 1 error")
+    parser.add_argument('--instruments', type=int, default=10, help="payment instruments returned")
+    options = parser.parse_args()
+
+    gateway = StubGateway(
+        host=options.host,
+        port=options.port,
+        latency=options.latency,
+        jitter=options.jitter,
+        error_rate=options.error_rate,
+        gateway_error_rate=options.gateway_error_rate,
+        instruments=options.instruments,
+    )
+    print(f"Stub NPS gateway listening on {gateway.url}")
+    try:
+        gateway.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
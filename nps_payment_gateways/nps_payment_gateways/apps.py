@@ -1,4 +1,8 @@
 from django.apps import AppConfig
 
 class NpsPaymentGatewaysConfig(AppConfig):
-    name = 'nps_payment_gateways'
\ No newline at end of file
+    name = 'nps_payment_gateways'
+    default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,27 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import NpsPaymentViewSet, TransactionStatusView, BulkTransactionStatusView, ExportView, GatewayStatusView, MetricsView
+from .async_views import (
+    AsyncPaymentInstrumentView,
+    AsyncProcessIdView,
+    AsyncNotificationView,
+    AsyncServiceChargeView,
+    AsyncBatchServiceChargeView,
+)
+
+router = DefaultRouter()
+router.register(r'npspayment', NpsPaymentViewSet)
+
+urlpatterns = [
+    path('', include(router.urls)),
+    path('payment-instruments/', AsyncPaymentInstrumentView.as_view(), name='payment-instruments'),
+    path('process-id/', AsyncProcessIdView.as_view(), name='process-id'),
+    path('notification/', AsyncNotificationView.as_view(), name='notification'),
+    path('transaction-status/', TransactionStatusView.as_view(), name='transaction-status'),
+    path('transaction-status/bulk/', BulkTransactionStatusView.as_view(async_streaming=True), name='transaction-status-bulk'),
+    path('export/<str:name>/', ExportView.as_view(async_streaming=True), name='export'),
+    path('gateway-status/', GatewayStatusView.as_view(), name='gateway-status'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('service-charge/', AsyncServiceChargeView.as_view(), name='service-charge'),
+    path('service-charge/batch/', AsyncBatchServiceChargeView.as_view(), name='service-charge-batch'),
+]
@@ -0,0 +1,268 @@
+"""
+Async (ASGI) variants of the NPS gateway views.
+
+Requires the optional async dependencies: pip install nps_payment_gateways[async]
+Route them with path('api/', include('nps_payment_gateways.async_urls')).
+"""
+import asyncio
+
+from adrf.views import APIView
+from asgiref.sync import sync_to_async
+from rest_framework import serializers, status
+from rest_framework.response import Response
+
+from . import metrics
+from .cache import AsyncSingleFlight, instrument_cache
+from .charges import service_charge_cache
+from .client import (
+    PAYMENT_INSTRUMENT_DETAILS,
+    SERVICE_CHARGE,
+    PROCESS_ID,
+    get_async_gateway_client,
+)
+from .conf import get_setting
+from .ledger import acheck_transaction_status, get_issued_transaction, record_process_id
+from .merchants import get_cached_merchant_config
+from .notifications import enqueue_notification
+from .polling import track_if_pending
+from .serializers import (
+    PaymentInstrumentRequestSerializer,
+    PaymentInstrumentResponseSerializer,
+    ProcessIdRequestSerializer,
+    NotificationRequestSerializer,
+    ServiceChargeRequestSerializer,
+)
+from .views import (
+    NPSGatewayMixin,
+    PaymentInstrumentView,
+    ServiceChargeView,
+    BatchServiceChargeView,
+    ProcessIdView,
+    NotificationView,
+)
+
+
+class AsyncNPSBaseAPIView(NPSGatewayMixin, APIView):
+    async def aget_nps_config(self):
+        with metrics.phase('config'):
+            config = get_cached_merchant_config(self.get_merchant_id())
+        if config is None:
+            config = await sync_to_async(self.get_nps_config)()
+        return config
+
+    async def amake_api_request(self, endpoint, payload, headers):
+        return await get_async_gateway_client().post(endpoint, payload, headers, priority=self.gateway_priority)
+
+
+class AsyncPaymentInstrumentView(AsyncNPSBaseAPIView, PaymentInstrumentView):
+    async def afetch_payment_instruments(self, signer):
+        payload = signer.build_payload(PAYMENT_INSTRUMENT_DETAILS)
+        response_data = await self.amake_api_request(PAYMENT_INSTRUMENT_DETAILS, payload, signer.headers)
+        return self.validate_response(response_data, PaymentInstrumentResponseSerializer), response_data
+
+    async def aget_payment_instruments(self, signer):
+        return await instrument_cache.aget_or_load(
+            signer.merchant_id,
+            lambda: self.afetch_payment_instruments(signer),
+            ttl=get_setting('NPS_INSTRUMENT_CACHE_TTL'),
+            stale_ttl=get_setting('NPS_INSTRUMENT_CACHE_STALE_TTL'),
+        )
+
+    async def get(self, request):
+        try:
+            serializer = PaymentInstrumentRequestSerializer(data=request.query_params)
+            serializer.is_valid(raise_exception=True)
+            signer = self.get_signer(await self.aget_nps_config())
+            return self.get_conditional_payment_instruments_response(signer, *await self.aget_payment_instruments(signer))
+        except serializers.ValidationError as e:
+            return self.get_error_response("Invalid request input.", errors=e.detail)
+        except ValueError as e:
+            return self.get_error_response(str(e), error_code="400")
+        except Exception as e:
+            return self.get_error_response("An unexpected error occurred.", error_code="500", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def post(self, request):
+        try:
+            serializer = PaymentInstrumentRequestSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            signer = self.get_signer(await self.aget_nps_config())
+            return self.get_payment_instruments_response(*await self.aget_payment_instruments(signer))
+        except serializers.ValidationError as e:
+            return self.get_error_response("Invalid request input.", errors=e.detail)
+        except ValueError as e:
+            return self.get_error_response(str(e), error_code="400")
+        except Exception as e:
+            return self.get_error_response("An unexpected error occurred.", error_code="500", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def delete(self, request):
+        return await sync_to_async(super().delete)(request)
+
+
+class AsyncServiceChargeView(AsyncNPSBaseAPIView, ServiceChargeView):
+    async def aget_service_charge(self, signer, amount, instrument_code):
+        data = service_charge_cache.get(signer.merchant_id, instrument_code, amount)
+        if data is not None:
+            return self.get_success_response("Service charge retrieved successfully.", data)
+        return await self.afetch_service_charge(signer, amount, instrument_code)
+
+    async def afetch_service_charge(self, signer, amount, instrument_code):
+        payload = signer.build_payload(SERVICE_CHARGE, Amount=amount, InstrumentCode=instrument_code)
+        response_data = await self.amake_api_request(SERVICE_CHARGE, payload, signer.headers)
+        return self.get_service_charge_response(signer, amount, instrument_code, response_data)
+
+    async def get(self, request):
+        try:
+            serializer = ServiceChargeRequestSerializer(data=request.query_params)
+            serializer.is_valid(raise_exception=True)
+            signer = self.get_signer(await self.aget_nps_config())
+            return self.get_conditional_service_charge_response(await self.aget_service_charge(
+                signer,
+                str(serializer.validated_data['amount']),
+                serializer.validated_data['payment_instrument_id']
+            ))
+        except serializers.ValidationError as e:
+            return self.get_error_response("Invalid request input.", errors=e.detail)
+        except ValueError as e:
+            return self.get_error_response(str(e), error_code="400")
+        except Exception as e:
+            return self.get_error_response("An unexpected error occurred.", error_code="500", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def post(self, request):
+        try:
+            serializer = ServiceChargeRequestSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            signer = self.get_signer(await self.aget_nps_config())
+            return await self.aget_service_charge(
+                signer,
+                str(serializer.validated_data['amount']),
+                serializer.validated_data['payment_instrument_id']
+            )
+        except serializers.ValidationError as e:
+            return self.get_error_response("Invalid request input.", errors=e.detail)
+        except ValueError as e:
+            return self.get_error_response(str(e), error_code="400")
+        except Exception as e:
+            return self.get_error_response("An unexpected error occurred.", error_code="500", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncBatchServiceChargeView(AsyncServiceChargeView, BatchServiceChargeView):
+    async def aget_batch_item_result(self, signer, amount, instrument_code, semaphore):
+        async with semaphore:
+            try:
+                response = await self.afetch_service_charge(signer, amount, instrument_code)
+            except ValueError as e:
+                response = self.get_error_response(str(e), error_code="400")
+            except Exception:
+                response = self.get_error_response("An unexpected error occurred.", error_code="500", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return response.data
+
+    async def post(self, request):
+        try:
+            pairs = self.get_batch_items(request)
+            signer = self.get_signer(await self.aget_nps_config())
+            results, pending = self.get_cached_batch_results(signer, pairs)
+            semaphore = asyncio.Semaphore(get_setting('NPS_BATCH_WORKERS'))
+            quotes = await asyncio.gather(*(self.aget_batch_item_result(signer, *pair, semaphore) for pair in pending))
+            results.update(zip(pending, quotes))
+            return self.get_batch_response(pairs, results)
+        except serializers.ValidationError as e:
+            return self.get_error_response("Invalid request input.", errors=e.detail)
+        except ValueError as e:
+            return self.get_error_response(str(e), error_code="400")
+        except Exception as e:
+            return self.get_error_response("An unexpected error occurred.", error_code="500", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# Concurrent GetProcessId calls for the same (merchant_id, merchant_txn_id)
+process_id_flights = AsyncSingleFlight()
+
+
+class AsyncProcessIdView(AsyncNPSBaseAPIView, ProcessIdView):
+    async def arequest_process_id(self, signer, payload, transaction_remarks, instrument_code):
+        response_data = await self.amake_api_request(PROCESS_ID, payload, signer.headers)
+        transaction = None
+        if response_data.get('code') == '0':
+            transaction = await sync_to_async(record_process_id)(
+                signer.merchant_id, payload, response_data["data"]["ProcessId"], transaction_remarks, instrument_code,
+                window=get_setting('NPS_PROCESS_ID_IDEMPOTENCY_WINDOW')
+            )
+        return response_data, transaction
+
+    async def post(self, request):
+        try:
+            serializer = ProcessIdRequestSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            TransactionRemarks = request.data.get('TransactionRemarks')
+            InstrumentCode = request.data.get('InstrumentCode')
+            signer = self.get_signer(await self.aget_nps_config())
+            payload = signer.build_payload(
+                PROCESS_ID,
+                Amount=str(serializer.validated_data['amount']),
+                MerchantTxnId=serializer.validated_data['merchant_txn_id']
+            )
+
+            window = get_setting('NPS_PROCESS_ID_IDEMPOTENCY_WINDOW')
+            if not window:
+                response_data, _ = await self.arequest_process_id(signer, payload, TransactionRemarks, InstrumentCode)
+                return self.get_process_id_response(payload, response_data, TransactionRemarks, InstrumentCode)
+
+            transaction = await sync_to_async(get_issued_transaction)(signer.merchant_id, payload["MerchantTxnId"], window)
+            if transaction is not None:
+                return self.get_issued_process_id_response(transaction, payload, TransactionRemarks, InstrumentCode)
+
+            async def request_once():
+                return payload, TransactionRemarks, InstrumentCode, await self.arequest_process_id(signer, payload, TransactionRemarks, InstrumentCode)
+
+            result = await process_id_flights.do((signer.merchant_id, payload["MerchantTxnId"]), request_once)
+            return self.get_shared_process_id_response(result, payload, TransactionRemarks, InstrumentCode)
+        except serializers.ValidationError as e:
+            return self.get_error_response("Invalid request input.", errors=e.detail)
+        except ValueError as e:
+            return self.get_error_response(str(e), error_code="400")
+        except Exception as e:
+            return self.get_error_response(
+                "An unexpected error occurred.",
+                error_code="500",
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class AsyncNotificationView(AsyncNPSBaseAPIView, NotificationView):
+    async def post(self, request):
+        try:
+            serializer = NotificationRequestSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            signer = self.get_signer(await self.aget_nps_config())
+
+            if get_setting('NPS_NOTIFICATION_MODE') == 'deferred':
+                await sync_to_async(enqueue_notification)(
+                    signer.merchant_id,
+                    serializer.validated_data['merchant_txn_id'],
+                    serializer.validated_data['gateway_txn_id']
+                )
+                return self.get_success_response("Notification received.")
+
+            data, response_data = await acheck_transaction_status(
+                signer,
+                serializer.validated_data['merchant_txn_id'],
+                serializer.validated_data['gateway_txn_id'],
+                post=self.amake_api_request
+            )
+            track_if_pending(
+                signer.merchant_id,
+                serializer.validated_data['merchant_txn_id'],
+                data,
+                response_data,
+                serializer.validated_data['gateway_txn_id']
+            )
+            return Response(response_data)
+        except serializers.ValidationError as e:
+            return self.get_error_response("Invalid request input.", errors=e.detail)
+        except ValueError as e:
+            return self.get_error_response(str(e), error_code="400")
+        except Exception as e:
+            return self.get_error_response(
+                "Could not process payment notification.",
+                error_code="500",
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
@@ -0,0 +1,204 @@
+"""
+Write-behind audit log of gateway calls.
+
+With NPS_AUDIT_LOG on, the gateway clients queue every signed request and the
+reply they got in memory, and a background thread writes them as
+NpsGatewayCall rows with bulk_create: as soon as NPS_AUDIT_BATCH_SIZE calls are
+waiting, or every NPS_AUDIT_FLUSH_INTERVAL seconds. Whatever is still queued is
+written when the process exits. The queue holds at most NPS_AUDIT_MAX_QUEUE
+calls; further calls, and batches the database refuses, are dropped and
+counted instead of slowing requests down.
+
+Headers named in NPS_AUDIT_REDACT_HEADERS are never stored.
+"""
+import atexit
+import collections
+import threading
+import time
+
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import metrics
+from .conf import get_setting
+
+REDACTED = '[redacted]'
+
+_enabled = None
+
+
+def enabled():
+    global _enabled
+    if _enabled is None:
+        _enabled = bool(get_setting('NPS_AUDIT_LOG'))
+    return _enabled
+
+
+@receiver(setting_changed)
+def _reload_settings(setting, **kwargs):
+    global _enabled
+    if setting.startswith('NPS_AUDIT'):
+        _enabled = None
+        reset_audit_log()
+
+
+class AuditLog:
+    """
+    Bounded in-memory queue of gateway calls, drained to the database by one daemon thread
+    """
+
+    def __init__(self, batch_size, flush_interval, max_queue, redact_headers):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.redact_headers = {name.lower() for name in redact_headers}
+        self._condition = threading.Condition()
+        self._queue = collections.deque()
+        self._thread = None
+        self._stopped = False
+        self.written = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            batch_size=get_setting('NPS_AUDIT_BATCH_SIZE'),
+            flush_interval=get_setting('NPS_AUDIT_FLUSH_INTERVAL'),
+            max_queue=get_setting('NPS_AUDIT_MAX_QUEUE'),
+            redact_headers=get_setting('NPS_AUDIT_REDACT_HEADERS'),
+        )
+
+    def record(self, endpoint, payload, headers, response, duration):
+        """
+        Queue one gateway call; never blocks on the database
+        """
+        call = (endpoint, payload, headers, response, duration, timezone.now())
+        with self._condition:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                dropped = True
+            else:
+                dropped = False
+                self._queue.append(call)
+                if len(self._queue) >= self.batch_size:
+                    self._condition.notify()
+                if self._thread is None:
+                    self._start()
+        if dropped:
+            metrics.increment('nps_audit_dropped_total')
+
+    def flush(self):
+        """
+        Write every queued call now; returns how many were written
+        """
+        written = 0
+        while True:
+            with self._condition:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            if not batch:
+                return written
+            written += self._write(batch)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def snapshot(self):
+        with self._condition:
+            return {"queued": len(self._queue), "written": self.written, "dropped": self.dropped}
+
+    def redact(self, headers):
+        return {name: REDACTED if name.lower() in self.redact_headers else value for name, value in (headers or {}).items()}
+
+    def build(self, call):
+        from .models import NpsGatewayCall
+
+        endpoint, payload, headers, response, duration, created_at = call
+        payload = payload if isinstance(payload, dict) else {}
+        result = response if isinstance(response, dict) else {}
+        return NpsGatewayCall(
+            merchant_id=str(payload.get("MerchantId") or '')[:100],
+            endpoint=endpoint,
+            merchant_txn_id=str(payload.get("MerchantTxnId") or '')[:50],
+            request_headers=self.redact(headers),
+            request_payload=payload,
+            response=response,
+            response_code=str(result.get("code") or '')[:10],
+            error_code=str(result.get("error_code") or '')[:10],
+            duration_ms=round(duration * 1000, 3),
+            created_at=created_at,
+        )
+
+    def _write(self, batch):
+        from .models import NpsGatewayCall
+
+        try:
+            NpsGatewayCall.objects.bulk_create([self.build(call) for call in batch])
+        except Exception:
+            # An audit write must never fail or hold up a payment; the batch is counted as dropped
+            with self._condition:
+                self.dropped += len(batch)
+            metrics.increment('nps_audit_dropped_total', len(batch))
+            return 0
+        with self._condition:
+            self.written += len(batch)
+        return len(batch)
+
+    def _start(self):
+        # Called with the condition held
+        self._thread = threading.Thread(target=self._run, name='nps-audit-log', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._stopped and len(self._queue) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                if self._stopped:
+                    return
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+_audit_log = None
+_audit_log_lock = threading.Lock()
+
+
+def get_audit_log():
+    """
+    Return the process-wide audit log, building it from settings on first use
+    """
+    global _audit_log
+    if _audit_log is None:
+        with _audit_log_lock:
+            if _audit_log is None:
+                _audit_log = AuditLog.from_settings()
+    return _audit_log
+
+
+def reset_audit_log():
+    """
+    Write out and drop the audit log so the next call rebuilds it from current settings
+    """
+    global _audit_log
+    with _audit_log_lock:
+        if _audit_log is not None:
+            _audit_log.stop()
+            _audit_log.flush()
+        _audit_log = None
+
+
+def record_call(endpoint, payload, headers, response, started):
+    """
+    Queue a gateway call that started at time.perf_counter() value started; a no-op unless NPS_AUDIT_LOG is on
+    """
+    if not enabled():
+        return
+    get_audit_log().record(endpoint, payload, headers, response, time.perf_counter() - started)
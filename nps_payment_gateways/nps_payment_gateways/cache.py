@@ -0,0 +1,366 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+from . import metrics
+from .conf import get_setting
+
+
+class _GenerationCache:
+    """
+    Entries guarded by a lock and a generation counter that every invalidation bumps.
+
+    Loads run outside the lock; a load stores its result only while the
+    generation it started under is current, so it cannot bring back an entry an
+    invalidation dropped in the meantime.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generation = 0
+
+    def _put(self, generation, key, entry):
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = entry
+
+    def _drop(self, key=None):
+        """
+        Drop one entry, or all of them when key is None, and return the keys dropped
+        """
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                keys = list(self._entries)
+                self._entries.clear()
+            else:
+                keys = [key]
+                self._entries.pop(key, None)
+        return keys
+
+
+class NpsConfigCache(_GenerationCache):
+    """
+    Process-wide cache of NpsPayment rows.
+
+    Entries live in process memory for NPS_CONFIG_CACHE_TTL seconds, and
+    invalidate() only clears the calling process; other processes keep their
+    entries until they expire. When NPS_CONFIG_CACHE_ALIAS names a shared Django
+    cache, that cache is used instead so an invalidation is seen by every
+    process at once. A key with no row is remembered for NPS_CONFIG_MISS_TTL
+    seconds, so requests naming an unknown merchant do not each query the database.
+    """
+    key_prefix = 'nps_payment_gateways:config'
+    # Stored for a key with no row; a string, so it survives a shared cache's pickling
+    missing = 'nps_payment_gateways:missing'
+
+    def _cache_key(self, key):
+        return f"{self.key_prefix}:{key}"
+
+    def get(self, loader, key='default'):
+        ttl = get_setting('NPS_CONFIG_CACHE_TTL')
+        if not ttl or ttl <= 0:
+            return loader()
+
+        miss_ttl = get_setting('NPS_CONFIG_MISS_TTL')
+        alias = get_setting('NPS_CONFIG_CACHE_ALIAS')
+        if alias:
+            backend = caches[alias]
+            config = backend.get(self._cache_key(key))
+            metrics.cache_lookup('config', 'miss' if config is None else 'hit')
+            if config is None:
+                config = loader()
+                if config is not None:
+                    backend.set(self._cache_key(key), config, ttl)
+                elif miss_ttl and miss_ttl > 0:
+                    backend.set(self._cache_key(key), self.missing, miss_ttl)
+            return None if config == self.missing else config
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            metrics.cache_lookup('config', 'hit')
+            return None if entry[1] is self.missing else entry[1]
+
+        metrics.cache_lookup('config', 'miss')
+        generation = self._generation
+        config = loader()
+        if config is None and miss_ttl and miss_ttl > 0:
+            ttl, value = miss_ttl, self.missing
+        else:
+            value = config
+        if value is not None:
+            self._put(generation, key, (time.monotonic() + ttl, value))
+        return config
+
+    def get_cached(self, key='default'):
+        """
+        Return a live in-process entry without loading; None on a miss or when a Django cache is configured
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic() and not get_setting('NPS_CONFIG_CACHE_ALIAS'):
+            if entry[1] is self.missing:
+                return None
+            metrics.cache_lookup('config', 'hit')
+            return entry[1]
+        return None
+
+    def invalidate(self, key=None):
+        keys = self._drop(key) or ['default']
+        alias = get_setting('NPS_CONFIG_CACHE_ALIAS')
+        if alias:
+            caches[alias].delete_many([self._cache_key(k) for k in keys])
+
+
+config_cache = NpsConfigCache()
+
+
+class _Flight:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key onto one execution.
+
+    The first caller runs the function; callers arriving while it runs wait for
+    and share its result or exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+
+class AsyncSingleFlight:
+    """
+    Async counterpart of SingleFlight; the call runs as one task per event loop and key that every caller awaits
+    """
+
+    def __init__(self):
+        self._tasks = {}
+
+    async def do(self, key, coroutine_fn):
+        loop = asyncio.get_running_loop()
+        task_key = (loop, key)
+        task = self._tasks.get(task_key)
+        if task is None:
+            task = loop.create_task(coroutine_fn())
+            self._tasks[task_key] = task
+            task.add_done_callback(lambda done: self._tasks.pop(task_key, None))
+        return await asyncio.shield(task)
+
+
+class _Entry:
+    __slots__ = ('value', 'fresh_until', 'stale_until', 'refreshing')
+
+    def __init__(self, value, ttl, stale_ttl):
+        now = time.monotonic()
+        self.value = value
+        self.fresh_until = now + ttl
+        self.stale_until = self.fresh_until + stale_ttl
+        self.refreshing = False
+
+
+class StaleWhileRevalidateCache(_GenerationCache):
+    """
+    In-process cache that serves stale values while one background refresh runs.
+
+    Fresh entries are returned as-is. Once an entry is past its TTL it is still
+    returned for stale_ttl more seconds while a single background thread reloads
+    it. Misses are single-flight, so concurrent callers wait on one load. Only
+    results accepted by the cacheable predicate are stored. Lookups are counted
+    in the metrics under name.
+    """
+
+    def __init__(self, cacheable=None, name='swr'):
+        super().__init__()
+        self.cacheable = cacheable or (lambda result: True)
+        self.name = name
+        self._flights = SingleFlight()
+        self._async_flights = AsyncSingleFlight()
+        self._async_refreshes = set()
+
+    def _lookup(self, key, start_refresh):
+        """
+        Return (hit, value); a stale hit calls start_refresh(entry, generation) once per entry
+        """
+        result, hit, value = 'miss', False, None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                now = time.monotonic()
+                if now < entry.fresh_until:
+                    result, hit, value = 'hit', True, entry.value
+                elif now < entry.stale_until:
+                    if not entry.refreshing:
+                        entry.refreshing = True
+                        start_refresh(entry, self._generation)
+                    result, hit, value = 'stale', True, entry.value
+        metrics.cache_lookup(self.name, result)
+        return hit, value
+
+    def get_or_load(self, key, loader, ttl, stale_ttl=0):
+        if not ttl or ttl <= 0:
+            return loader()
+
+        def start_refresh(entry, generation):
+            threading.Thread(
+                target=self._refresh,
+                args=(key, entry, loader, ttl, stale_ttl, generation),
+                daemon=True,
+            ).start()
+
+        hit, value = self._lookup(key, start_refresh)
+        if hit:
+            return value
+        return self._flights.do(key, lambda: self._load(key, loader, ttl, stale_ttl))
+
+    async def aget_or_load(self, key, loader, ttl, stale_ttl=0):
+        """
+        Async variant of get_or_load; loader is a coroutine function and refreshes run as tasks
+        """
+        if not ttl or ttl <= 0:
+            return await loader()
+
+        loop = asyncio.get_running_loop()
+
+        def start_refresh(entry, generation):
+            task = loop.create_task(self._arefresh(key, entry, loader, ttl, stale_ttl, generation))
+            self._async_refreshes.add(task)
+            task.add_done_callback(self._async_refreshes.discard)
+
+        hit, value = self._lookup(key, start_refresh)
+        if hit:
+            return value
+
+        return await self._async_flights.do(key, lambda: self._aload(key, loader, ttl, stale_ttl))
+
+    def peek(self, key):
+        """
+        Return the cached value, fresh or stale, without loading; None when absent or expired
+        """
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry.stale_until:
+            return entry.value
+        return None
+
+    def _load(self, key, loader, ttl, stale_ttl):
+        generation = self._generation
+        result = loader()
+        self._store(key, result, ttl, stale_ttl, generation)
+        return result
+
+    async def _aload(self, key, loader, ttl, stale_ttl):
+        generation = self._generation
+        result = await loader()
+        self._store(key, result, ttl, stale_ttl, generation)
+        return result
+
+    async def _arefresh(self, key, entry, loader, ttl, stale_ttl, generation):
+        try:
+            self._store(key, await loader(), ttl, stale_ttl, generation)
+        except Exception:
+            pass
+        finally:
+            entry.refreshing = False
+
+    def _refresh(self, key, entry, loader, ttl, stale_ttl, generation):
+        try:
+            self._store(key, loader(), ttl, stale_ttl, generation)
+        except Exception:
+            pass
+        finally:
+            entry.refreshing = False
+
+    def _store(self, key, result, ttl, stale_ttl, generation):
+        if self.cacheable(result):
+            self._put(generation, key, _Entry(result, ttl, stale_ttl))
+
+    def invalidate(self, key=None):
+        self._drop(key)
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded mapping with a per-entry TTL; the least recently used entry is evicted first
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        if self.maxsize <= 0 or not ttl or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate=None):
+        with self._lock:
+            if predicate is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if predicate(key)]:
+                    del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Validated GetPaymentInstrumentDetails data per merchant, stored as (data, raw response)
+instrument_cache = StaleWhileRevalidateCache(cacheable=lambda result: result[0] is not None, name='payment_instruments')
+
+
+def invalidate_payment_instruments(merchant_id=None):
+    """
+    Drop cached payment instruments for one merchant, or for all merchants
+    """
+    instrument_cache.invalidate(merchant_id)
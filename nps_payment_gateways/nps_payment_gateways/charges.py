@@ -0,0 +1,149 @@
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+
+from . import metrics
+from .cache import LRUCache
+from .conf import get_setting
+
+FLAT_COMMISSION_TYPES = {'flat', 'fixed', 'amount'}
+PERCENTAGE_COMMISSION_TYPES = {'percentage', 'percent'}
+
+CENT = Decimal('0.01')
+
+
+def compute_service_charge(commission_type, charge_value, amount):
+    """
+    Return the charge for an amount, or None when the commission type is unknown
+    or the exact charge would need rounding, which is left to the gateway
+    """
+    kind = commission_type.strip().lower()
+    if kind in FLAT_COMMISSION_TYPES:
+        charge = charge_value
+    elif kind in PERCENTAGE_COMMISSION_TYPES:
+        charge = amount * charge_value / 100
+    else:
+        return None
+    if charge != charge.quantize(CENT):
+        return None
+    return charge.quantize(CENT)
+
+
+class _ChargeRule:
+    __slots__ = ('commission_type', 'charge_value', 'response', 'low', 'high', 'learned_at')
+
+    def __init__(self, commission_type, charge_value, response, low, high):
+        self.commission_type = commission_type
+        self.charge_value = charge_value
+        self.response = response
+        # Smallest and largest amounts the gateway confirmed the rule at
+        self.low = low
+        self.high = high
+        self.learned_at = time.monotonic()
+
+    def matches(self, commission_type, charge_value):
+        return (self.commission_type, self.charge_value) == (commission_type, charge_value)
+
+
+class ServiceChargeCache:
+    """
+    Service charge quotes keyed by (merchant, instrument, amount).
+
+    Quotes returned by GetServiceCharge are kept in a bounded LRU. With
+    NPS_SERVICE_CHARGE_LOCAL_COMPUTE on, the ChargeValue of flat and percentage
+    commissions is also learned per instrument, along with the range of amounts
+    the gateway quoted it for. Quotes for new amounts inside that range are
+    computed locally until the rule is older than NPS_SERVICE_CHARGE_REVERIFY_INTERVAL
+    and the next quote is fetched again; amounts outside it always go to the
+    gateway, since slab pricing may charge them differently. A rule is only
+    learned when it reproduces the gateway's own TotalChargeAmount.
+    """
+
+    def __init__(self, maxsize):
+        self.quotes = LRUCache(maxsize)
+        self._lock = threading.Lock()
+        self._rules = {}
+
+    def get(self, merchant_id, instrument_code, amount):
+        """
+        Return the validated ServiceChargeResponseSerializer data for a quote, or None on a miss
+        """
+        quote = self.quotes.get((merchant_id, instrument_code, amount))
+        if quote is not None:
+            metrics.cache_lookup('service_charge', 'hit')
+            return quote
+        quote = self._compute(merchant_id, instrument_code, amount)
+        metrics.cache_lookup('service_charge', 'miss' if quote is None else 'computed')
+        return quote
+
+    def _compute(self, merchant_id, instrument_code, amount):
+        if not get_setting('NPS_SERVICE_CHARGE_LOCAL_COMPUTE'):
+            return None
+
+        rule = self._rules.get((merchant_id, instrument_code))
+        if rule is None or time.monotonic() - rule.learned_at > get_setting('NPS_SERVICE_CHARGE_REVERIFY_INTERVAL'):
+            return None
+        value = Decimal(amount)
+        if not rule.low <= value <= rule.high:
+            return None
+        total = compute_service_charge(rule.commission_type, rule.charge_value, value)
+        if total is None:
+            return None
+        data = rule.response["data"]
+        quote = {
+            **rule.response,
+            "data": {
+                "Amount": amount,
+                "CommissionType": data["CommissionType"],
+                "ChargeValue": data["ChargeValue"],
+                "TotalChargeAmount": str(total),
+            }
+        }
+        self.quotes.set((merchant_id, instrument_code, amount), quote, get_setting('NPS_SERVICE_CHARGE_CACHE_TTL'))
+        return quote
+
+    def add(self, merchant_id, instrument_code, amount, response):
+        """
+        Store a validated gateway quote and learn its charge rule when it is reproducible
+        """
+        self.quotes.set((merchant_id, instrument_code, amount), response, get_setting('NPS_SERVICE_CHARGE_CACHE_TTL'))
+
+        data = response.get("data")
+        if not data or data.get("Amount") != amount:
+            return
+        key = (merchant_id, instrument_code)
+        try:
+            value = Decimal(amount)
+            charge_value = Decimal(data["ChargeValue"])
+            total = compute_service_charge(data["CommissionType"], charge_value, value)
+        except (InvalidOperation, KeyError, TypeError, AttributeError):
+            with self._lock:
+                self._rules.pop(key, None)
+            return
+
+        with self._lock:
+            rule = self._rules.get(key)
+            if total is not None and str(total) == data.get("TotalChargeAmount"):
+                low, high = value, value
+                if rule is not None and rule.matches(data["CommissionType"], charge_value):
+                    # Another amount confirms the rule, so it covers everything between them
+                    low, high = min(low, rule.low), max(high, rule.high)
+                self._rules[key] = _ChargeRule(data["CommissionType"], charge_value, response, low, high)
+            elif total is not None or rule is None or not rule.matches(data["CommissionType"], charge_value):
+                # The gateway disagrees with the learned rule; amounts that need rounding leave a matching rule in place
+                self._rules.pop(key, None)
+
+    def invalidate(self, merchant_id=None):
+        with self._lock:
+            if merchant_id is None:
+                self._rules.clear()
+            else:
+                for key in [key for key in self._rules if key[0] == merchant_id]:
+                    del self._rules[key]
+        if merchant_id is None:
+            self.quotes.invalidate()
+        else:
+            self.quotes.invalidate(lambda key: key[0] == merchant_id)
+
+
+service_charge_cache = ServiceChargeCache(get_setting('NPS_SERVICE_CHARGE_CACHE_SIZE'))
@@ -0,0 +1,379 @@
+import asyncio
+import threading
+import time
+import weakref
+from functools import partial
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import audit, metrics
+from .conf import get_setting
+from .fastjson import decode_response
+from .resilience import (
+    PRIORITY_HIGH,
+    PRIORITY_NORMAL,
+    AdmissionControl,
+    AsyncAdmissionControl,
+    RetryPolicy,
+    get_breaker,
+)
+
+# Gateway endpoints
+PAYMENT_INSTRUMENT_DETAILS = 'GetPaymentInstrumentDetails'
+SERVICE_CHARGE = 'GetServiceCharge'
+PROCESS_ID = 'GetProcessId'
+TRANSACTION_STATUS = 'CheckTransactionStatus'
+
+# Error results returned in place of a gateway response
+HTTP_ERROR = {"code": "1", "message": "Gateway returned an error.", "error_code": "400"}
+TIMEOUT_ERROR = {"code": "1", "message": "Payment server did not respond in time.", "error_code": "504"}
+DECODE_ERROR = {"code": "1", "message": "Received an unexpected response from the server.", "error_code": "500"}
+CONNECTION_ERROR = {"code": "1", "message": "Unable to connect to the payment server.", "error_code": "500"}
+UNAVAILABLE_ERROR = {"code": "1", "message": "Payment server is temporarily unavailable.", "error_code": "503"}
+BUSY_ERROR = {"code": "1", "message": "Payment server is busy, please try again.", "error_code": "503"}
+
+# Idempotent endpoints retry connect failures and gateway 502/503/504; GetProcessId never retries
+DEFAULT_RETRY_POLICIES = {
+    PAYMENT_INSTRUMENT_DETAILS: {'attempts': 3, 'base_delay': 0.1, 'max_delay': 1.0},
+    SERVICE_CHARGE: {'attempts': 3, 'base_delay': 0.1, 'max_delay': 1.0},
+    PROCESS_ID: {'attempts': 1},
+    TRANSACTION_STATUS: {'attempts': 3, 'base_delay': 0.2, 'max_delay': 2.0},
+}
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+
+# Per-endpoint caps on concurrent and queued calls, inside the shared NPS_BULKHEAD_LIMIT.
+# GetProcessId has no cap of its own so checkout can use every shared slot.
+DEFAULT_BULKHEADS = {
+    PAYMENT_INSTRUMENT_DETAILS: {'limit': 8, 'queue_size': 32},
+    SERVICE_CHARGE: {'limit': 16, 'queue_size': 64},
+    TRANSACTION_STATUS: {'limit': 16, 'queue_size': 128},
+}
+# Queued GetProcessId calls are admitted ahead of the other endpoints
+DEFAULT_PRIORITIES = {
+    PROCESS_ID: PRIORITY_HIGH,
+}
+
+
+def get_retry_policy(endpoint):
+    """
+    Return the retry policy for an endpoint, with NPS_RETRY_POLICIES overriding the defaults
+    """
+    overrides = get_setting('NPS_RETRY_POLICIES') or {}
+    return RetryPolicy(**{**DEFAULT_RETRY_POLICIES.get(endpoint, {}), **overrides.get(endpoint, {})})
+
+
+def get_admission_control(admission_class):
+    """
+    Build a client's admission control from settings, with NPS_BULKHEADS overriding the per-endpoint defaults.
+
+    Returns None when NPS_BULKHEAD_LIMIT is 0, which admits every call at once.
+    """
+    limit = get_setting('NPS_BULKHEAD_LIMIT')
+    if not limit:
+        return None
+    overrides = get_setting('NPS_BULKHEADS') or {}
+    endpoints = {}
+    for endpoint in {**DEFAULT_BULKHEADS, **overrides}:
+        if endpoint in overrides and overrides[endpoint] is None:
+            continue
+        endpoints[endpoint] = {**DEFAULT_BULKHEADS.get(endpoint, {}), **overrides.get(endpoint, {})}
+    return admission_class(
+        limit,
+        get_setting('NPS_BULKHEAD_QUEUE_SIZE'),
+        get_setting('NPS_BULKHEAD_QUEUE_TIMEOUT'),
+        endpoints,
+    )
+
+
+def get_priority(endpoint, priority=None):
+    return DEFAULT_PRIORITIES.get(endpoint, PRIORITY_NORMAL) if priority is None else priority
+
+
+def _http_result(status_code, decode):
+    """
+    Return (result, retryable) for a gateway HTTP response
+    """
+    if status_code >= 400:
+        return dict(HTTP_ERROR), status_code in RETRYABLE_STATUS_CODES
+    try:
+        return decode(), False
+    except ValueError:
+        return dict(DECODE_ERROR), False
+
+
+class NpsGatewayClient:
+    """
+    Pooled, keep-alive HTTP client for the NPS gateway.
+
+    A single instance is shared by every request thread. The session is never
+    mutated after construction and cookies are refused, so the only shared state
+    is urllib3's connection pool, which is thread-safe.
+    """
+
+    def __init__(self, base_url, pool_connections, pool_maxsize, pool_block, connect_timeout, read_timeout, admission=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.admission = admission
+        self.session = requests.Session()
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.session.headers['Connection'] = 'keep-alive'
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            base_url=get_setting('NPS_BASE_URL'),
+            pool_connections=get_setting('NPS_POOL_CONNECTIONS'),
+            pool_maxsize=get_setting('NPS_POOL_MAXSIZE'),
+            pool_block=get_setting('NPS_POOL_BLOCK'),
+            connect_timeout=get_setting('NPS_CONNECT_TIMEOUT'),
+            read_timeout=get_setting('NPS_READ_TIMEOUT'),
+            admission=get_admission_control(AdmissionControl),
+        )
+
+    def url(self, endpoint):
+        return f"{self.base_url}/{endpoint}"
+
+    def post(self, endpoint, payload, headers, priority=None):
+        """
+        Send a signed request and return the decoded reply, or an error result.
+
+        Transient failures are retried per the endpoint's retry policy with jittered
+        backoff, all within NPS_REQUEST_DEADLINE seconds. Calls fail fast while the
+        endpoint's circuit breaker is open, and when the bulkheads have no slot free
+        within NPS_BULKHEAD_QUEUE_TIMEOUT seconds. With NPS_AUDIT_LOG on, every call
+        is queued for the audit log.
+        """
+        start = time.perf_counter()
+        with metrics.upstream(endpoint):
+            result = self._admit(endpoint, payload, headers, priority)
+        audit.record_call(endpoint, payload, headers, result, start)
+        return result
+
+    def _admit(self, endpoint, payload, headers, priority):
+        deadline = time.monotonic() + get_setting('NPS_REQUEST_DEADLINE')
+        if self.admission is None:
+            return self._post(endpoint, payload, headers, deadline)
+        start = time.perf_counter()
+        taken = self.admission.acquire(endpoint, get_priority(endpoint, priority), deadline)
+        metrics.observe('nps_admission_wait_seconds', time.perf_counter() - start, endpoint=endpoint)
+        if taken is None:
+            metrics.upstream_response(endpoint, 'rejected')
+            return dict(BUSY_ERROR)
+        try:
+            return self._post(endpoint, payload, headers, deadline)
+        finally:
+            self.admission.release(taken)
+
+    def _post(self, endpoint, payload, headers, deadline):
+        policy = get_retry_policy(endpoint)
+        breaker = get_breaker(endpoint)
+        attempt = 1
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                metrics.upstream_response(endpoint, 'deadline')
+                return dict(TIMEOUT_ERROR)
+            if not breaker.allow():
+                metrics.upstream_response(endpoint, 'circuit_open')
+                return dict(UNAVAILABLE_ERROR)
+            result, retryable = self._send(endpoint, payload, headers, remaining, breaker)
+            if not retryable or attempt >= policy.attempts:
+                return result
+            delay = policy.backoff(attempt)
+            if time.monotonic() + delay >= deadline:
+                return result
+            time.sleep(delay)
+            attempt += 1
+
+    def _send(self, endpoint, payload, headers, remaining, breaker):
+        timeout = (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+        try:
+            response = self.session.post(self.url(endpoint), json=payload, headers=headers, timeout=timeout)
+        except requests.exceptions.ConnectTimeout:
+            breaker.record_failure()
+            metrics.upstream_response(endpoint, 'timeout')
+            return dict(TIMEOUT_ERROR), True
+        except requests.exceptions.Timeout:
+            breaker.record_failure()
+            metrics.upstream_response(endpoint, 'timeout')
+            return dict(TIMEOUT_ERROR), False
+        except requests.exceptions.ConnectionError:
+            breaker.record_failure()
+            metrics.upstream_response(endpoint, 'connection_error')
+            return dict(CONNECTION_ERROR), True
+        except Exception:
+            breaker.record_failure()
+            metrics.upstream_response(endpoint, 'error')
+            return dict(CONNECTION_ERROR), False
+
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        metrics.upstream_response(endpoint, response.status_code)
+        return _http_result(response.status_code, partial(decode_response, response))
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncNpsGatewayClient:
+    """
+    Pooled HTTP client for the NPS gateway used by the async views.
+
+    Requires the optional httpx dependency (pip install nps_payment_gateways[async]).
+    The connection pool belongs to the event loop that created it, so one client
+    is kept per running loop.
+    """
+
+    def __init__(self, base_url, pool_maxsize, connect_timeout, read_timeout, admission=None):
+        import httpx
+
+        self._httpx = httpx
+        self.base_url = base_url.rstrip('/')
+        self.admission = admission
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize),
+        )
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            base_url=get_setting('NPS_BASE_URL'),
+            pool_maxsize=get_setting('NPS_POOL_MAXSIZE'),
+            connect_timeout=get_setting('NPS_CONNECT_TIMEOUT'),
+            read_timeout=get_setting('NPS_READ_TIMEOUT'),
+            admission=get_admission_control(AsyncAdmissionControl),
+        )
+
+    def url(self, endpoint):
+        return f"{self.base_url}/{endpoint}"
+
+    async def post(self, endpoint, payload, headers, priority=None):
+        """
+        Async counterpart of NpsGatewayClient.post with the same retry, deadline, breaker and admission rules.
+
+        The bulkheads belong to this client, so they limit the calls of its event loop.
+        """
+        start = time.perf_counter()
+        with metrics.upstream(endpoint):
+            result = await self._admit(endpoint, payload, headers, priority)
+        audit.record_call(endpoint, payload, headers, result, start)
+        return result
+
+    async def _admit(self, endpoint, payload, headers, priority):
+        deadline = time.monotonic() + get_setting('NPS_REQUEST_DEADLINE')
+        if self.admission is None:
+            return await self._post(endpoint, payload, headers, deadline)
+        start = time.perf_counter()
+        taken = await self.admission.acquire(endpoint, get_priority(endpoint, priority), deadline)
+        metrics.observe('nps_admission_wait_seconds', time.perf_counter() - start, endpoint=endpoint)
+        if taken is None:
+            metrics.upstream_response(endpoint, 'rejected')
+            return dict(BUSY_ERROR)
+        try:
+            return await self._post(endpoint, payload, headers, deadline)
+        finally:
+            self.admission.release(taken)
+
+    async def _post(self, endpoint, payload, headers, deadline):
+        policy = get_retry_policy(endpoint)
+        breaker = get_breaker(endpoint)
+        attempt = 1
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                metrics.upstream_response(endpoint, 'deadline')
+                return dict(TIMEOUT_ERROR)
+            if not breaker.allow():
+                metrics.upstream_response(endpoint, 'circuit_open')
+                return dict(UNAVAILABLE_ERROR)
+            result, retryable = await self._send(endpoint, payload, headers, remaining, breaker)
+            if not retryable or attempt >= policy.attempts:
+                return result
+            delay = policy.backoff(attempt)
+            if time.monotonic() + delay >= deadline:
+                return result
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _send(self, endpoint, payload, headers, remaining, breaker):
+        httpx = self._httpx
+        timeout = httpx.Timeout(min(self.read_timeout, remaining), connect=min(self.connect_timeout, remaining))
+        try:
+            response = await self.client.post(self.url(endpoint), json=payload, headers=headers, timeout=timeout)
+        except httpx.ConnectTimeout:
+            breaker.record_failure()
+            metrics.upstream_response(endpoint, 'timeout')
+            return dict(TIMEOUT_ERROR), True
+        except httpx.TimeoutException:
+            breaker.record_failure()
+            metrics.upstream_response(endpoint, 'timeout')
+            return dict(TIMEOUT_ERROR), False
+        except httpx.ConnectError:
+            breaker.record_failure()
+            metrics.upstream_response(endpoint, 'connection_error')
+            return dict(CONNECTION_ERROR), True
+        except Exception:
+            breaker.record_failure()
+            metrics.upstream_response(endpoint, 'error')
+            return dict(CONNECTION_ERROR), False
+
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        metrics.upstream_response(endpoint, response.status_code)
+        return _http_result(response.status_code, partial(decode_response, response))
+
+    async def close(self):
+        await self.client.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_gateway_client():
+    """
+    Return the process-wide gateway client, building it from settings on first use
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = NpsGatewayClient.from_settings()
+    return _client
+
+
+def reset_gateway_client():
+    """
+    Drop the shared client so the next call rebuilds it, e.g. after changing settings
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_gateway_client():
+    """
+    Return the gateway client for the running event loop, building it on first use
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncNpsGatewayClient.from_settings()
+    return client
@@ -0,0 +1,71 @@
+"""
+Conditional GET for payment-instruments/ and service-charge/.
+
+Successful GET responses carry a strong ETag, a hash of the response body with
+its keys sorted and of the media type it is rendered as, along with
+Cache-Control and Vary headers. A request whose If-None-Match lists the current
+ETag gets 304 Not Modified with no body. Instruments and quotes are served
+from their caches, so a revalidation within the cache TTL never reaches the
+gateway.
+"""
+import hashlib
+import json
+
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .cache import LRUCache
+
+# (source, etag) per key, so a cached payment instrument list is hashed once instead of on every request
+_etags = LRUCache(1024)
+
+
+def compute_etag(data, media_type=''):
+    """
+    Return a strong ETag for response data rendered as media_type
+    """
+    content = json.dumps(data, cls=JSONEncoder, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    digest = hashlib.sha256(f"{media_type}\n{content}".encode('utf-8', 'surrogatepass')).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def get_etag(data, media_type, key, source, ttl):
+    """
+    Return the ETag of data, reusing the one computed for key while it was built from the same source object
+    """
+    entry = _etags.get(key)
+    if entry is not None and entry[0] is source:
+        return entry[1]
+    etag = compute_etag(data, media_type)
+    _etags.set(key, (source, etag), ttl)
+    return etag
+
+
+def etag_matches(request, etag):
+    """
+    Whether the request's If-None-Match lists etag, compared weakly as RFC 9110 requires
+    """
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return etags == ['*'] or etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in etags}
+
+
+def conditional_response(request, response, etag, max_age, vary=()):
+    """
+    Return 304 Not Modified when If-None-Match lists etag, otherwise response; either way with ETag,
+    Cache-Control and Vary set. A max_age of 0 makes clients revalidate on every use.
+    """
+    if etag_matches(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    response['ETag'] = etag
+    if max_age and max_age > 0:
+        patch_cache_control(response, private=True, max_age=max_age)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Accept', *vary))
+    return response
@@ -0,0 +1,80 @@
+from django.conf import settings
+
+DEFAULTS = {
+    # Gateway HTTP client
+    'NPS_BASE_URL': 'https://apisandbox.nepalpayment.com',
+    'NPS_POOL_CONNECTIONS': 4,
+    'NPS_POOL_MAXSIZE': 32,
+    'NPS_POOL_BLOCK': False,
+    'NPS_CONNECT_TIMEOUT': 3.05,
+    'NPS_READ_TIMEOUT': 15,
+    'NPS_REQUEST_DEADLINE': 20,
+    'NPS_RETRY_POLICIES': {},
+    'NPS_BREAKER_FAILURE_THRESHOLD': 5,
+    'NPS_BREAKER_RECOVERY_TIMEOUT': 30,
+    'NPS_BULKHEAD_LIMIT': 32,
+    'NPS_BULKHEAD_QUEUE_SIZE': 128,
+    'NPS_BULKHEAD_QUEUE_TIMEOUT': 1.0,
+    'NPS_BULKHEADS': {},
+    # Merchant configuration and selection
+    'NPS_MERCHANT_HEADER': 'X-Merchant-Id',
+    'NPS_CONFIG_CACHE_TTL': 300,
+    'NPS_CONFIG_CACHE_ALIAS': None,
+    'NPS_CONFIG_MISS_TTL': 30,
+    'NPS_CONFIG_PAGE_SIZE': 100,
+    'NPS_CONFIG_MAX_PAGE_SIZE': 1000,
+    # Payment instrument cache
+    'NPS_INSTRUMENT_CACHE_TTL': 300,
+    'NPS_INSTRUMENT_CACHE_STALE_TTL': 3600,
+    'NPS_INSTRUMENT_MAX_AGE': 0,
+    # Service charge quotes
+    'NPS_SERVICE_CHARGE_CACHE_SIZE': 4096,
+    'NPS_SERVICE_CHARGE_CACHE_TTL': 300,
+    'NPS_SERVICE_CHARGE_LOCAL_COMPUTE': False,
+    'NPS_SERVICE_CHARGE_REVERIFY_INTERVAL': 600,
+    'NPS_SERVICE_CHARGE_MAX_AGE': 0,
+    # Batch endpoints
+    'NPS_BATCH_WORKERS': 8,
+    'NPS_BATCH_MAX_ITEMS': 50,
+    'NPS_BULK_STATUS_WORKERS': 8,
+    'NPS_BULK_STATUS_RATE': 20,
+    'NPS_BULK_STATUS_MAX_ITEMS': 50,
+    # Exports
+    'NPS_EXPORT_CHUNK_SIZE': 2000,
+    # Pending transaction polling
+    'NPS_PENDING_POLLING': False,
+    'NPS_PENDING_POLL_INITIAL_DELAY': 5,
+    'NPS_PENDING_POLL_MAX_DELAY': 300,
+    'NPS_PENDING_POLL_MAX_ATTEMPTS': 12,
+    'NPS_PENDING_POLL_GIVE_UP': 3600,
+    'NPS_PENDING_POLL_WORKERS': 2,
+    'NPS_PENDING_POLL_MAX_TRACKED': 10000,
+    # ProcessId idempotency
+    'NPS_PROCESS_ID_IDEMPOTENCY_WINDOW': 900,
+    # Notification webhook
+    'NPS_NOTIFICATION_MODE': 'sync',
+    'NPS_NOTIFICATION_MAX_ATTEMPTS': 8,
+    'NPS_NOTIFICATION_RETRY_BACKOFF': 30,
+    'NPS_NOTIFICATION_LEASE': 300,
+    # Gateway call audit log
+    'NPS_AUDIT_LOG': False,
+    'NPS_AUDIT_BATCH_SIZE': 200,
+    'NPS_AUDIT_FLUSH_INTERVAL': 2.0,
+    'NPS_AUDIT_MAX_QUEUE': 10000,
+    'NPS_AUDIT_REDACT_HEADERS': ('Authorization',),
+    # Gateway response validation
+    'NPS_FAST_VALIDATION': True,
+    # JSON encoding and decoding
+    'NPS_FAST_JSON': True,
+    # Metrics
+    'NPS_METRICS_ENABLED': False,
+    'NPS_METRICS_CALLBACK': None,
+    'NPS_METRICS_BUCKETS': (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+}
+
+
+def get_setting(name):
+    """
+    Return an NPS setting from the project settings, falling back to the app default
+    """
+    return getattr(settings, name, DEFAULTS[name])
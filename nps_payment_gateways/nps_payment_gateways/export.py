@@ -0,0 +1,126 @@
+"""
+Streaming exports of the transaction ledger, the notification queue and the gateway call audit log.
+
+Rows are read in keyset chunks of NPS_EXPORT_CHUNK_SIZE (pk greater than the
+last one sent), so memory stays flat however many rows match and no database
+cursor is held open while a slow client reads. Every row carries its id; an
+interrupted export is resumed by passing the last id received as the cursor.
+"""
+import csv
+import datetime
+import decimal
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import NpsGatewayCall, NpsNotification, NpsTransaction
+from .streaming import aiterate
+
+# Export name: (model, exported fields, field the status filter applies to); the first field must be the primary key
+EXPORTS = {
+    'transactions': (NpsTransaction, (
+        'id', 'merchant_id', 'merchant_txn_id', 'process_id', 'gateway_reference_no', 'gateway_txn_id',
+        'amount', 'instrument_code', 'transaction_remarks', 'status', 'status_response', 'created_at', 'updated_at',
+    ), 'status'),
+    'notifications': (NpsNotification, (
+        'id', 'merchant_id', 'merchant_txn_id', 'gateway_txn_id', 'status', 'attempts', 'last_error',
+        'next_attempt_at', 'created_at', 'updated_at',
+    ), 'status'),
+    'gateway-calls': (NpsGatewayCall, (
+        'id', 'merchant_id', 'endpoint', 'merchant_txn_id', 'response_code', 'error_code', 'duration_ms',
+        'request_headers', 'request_payload', 'response', 'created_at',
+    ), 'response_code'),
+}
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+_encoder = JSONEncoder()
+
+
+def get_export_queryset(name, merchant_id=None, status=None, created_from=None, created_to=None, after=None):
+    """
+    Return the rows of an export in primary key order; created_from is inclusive and created_to exclusive
+    """
+    model, fields, status_field = EXPORTS[name]
+    queryset = model.objects.all()
+    if merchant_id:
+        queryset = queryset.filter(merchant_id=merchant_id)
+    if status:
+        queryset = queryset.filter(**{status_field: status})
+    if created_from is not None:
+        queryset = queryset.filter(created_at__gte=created_from)
+    if created_to is not None:
+        queryset = queryset.filter(created_at__lt=created_to)
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+    return queryset.order_by('pk')
+
+
+def iter_chunks(queryset, fields, chunk_size):
+    """
+    Yield lists of up to chunk_size value tuples, each read with its own query
+    """
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(chunk.values_list(*fields)[:chunk_size].iterator())
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][0]
+
+
+def _json_value(value):
+    # Amounts keep their exact decimal places, as DRF's DecimalField renders them
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def _dumps(value):
+    return json.dumps(value, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return _dumps(value)
+    if isinstance(value, datetime.datetime):
+        return _encoder.default(value)
+    return value
+
+
+class _Echo:
+    """
+    File-like object whose write returns the line, so csv.writer can build rows for a streaming response
+    """
+    def write(self, value):
+        return value
+
+
+def stream_export(name, export_format, queryset, chunk_size):
+    """
+    Yield the export as text, one chunk of rows at a time
+    """
+    fields = EXPORTS[name][1]
+    if export_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fields)
+        for rows in iter_chunks(queryset, fields, chunk_size):
+            yield ''.join(writer.writerow([_csv_value(value) for value in row]) for row in rows)
+    else:
+        for rows in iter_chunks(queryset, fields, chunk_size):
+            yield ''.join(_dumps(dict(zip(fields, map(_json_value, row)))) + '\n' for row in rows)
+
+
+def astream_export(chunks):
+    """
+    Serve a stream_export generator to an ASGI server, reading each chunk in a worker thread
+    """
+    return aiterate(chunks)
@@ -0,0 +1,121 @@
+"""
+orjson fast path for the JSON the gateway views read and write.
+
+With orjson installed (pip install nps_payment_gateways[fast]) and NPS_FAST_JSON
+on, the views render responses and parse request bodies with orjson, and the
+gateway clients decode replies straight from the response bytes. The output is
+byte-for-byte what DRF's JSONRenderer and JSONParser produce: anything orjson
+writes or reads differently (floats with an exponent, integers beyond 64 bits,
+lone surrogates, non-UTF-8 bodies) and anything it rejects goes through DRF or
+the HTTP client's own decoder instead. The one exception is data DRF refuses to
+render at all: Enum members and NaN or infinite floats come out as their value
+and null instead of raising.
+"""
+import io
+import re
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from .conf import get_setting
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # Datetimes and dataclasses go to DRF's encoder, which formats them its own way
+    OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+# orjson writes 1e16 and 0.00001 where json.dumps writes 1e+16 and 1e-05. Both
+# searches start from a literal, which keeps them fast on large responses.
+_EXPONENT = re.compile(rb'e(?<=[0-9]e)')
+_SMALL_FLOAT = b'0.0000'
+# orjson reads integers outside the 64-bit range as floats; they have 19 digits or more
+_DIGITS = bytes.maketrans(b'123456789', b'000000000')
+_LONG_NUMBER = b'0' * 19
+
+_UTF8 = {'utf-8', 'utf8'}
+
+
+def enabled():
+    return orjson is not None and get_setting('NPS_FAST_JSON')
+
+
+def loads(content):
+    """
+    Decode UTF-8 JSON bytes with orjson; raises ValueError where json.loads might read them differently
+    """
+    if _LONG_NUMBER in content.translate(_DIGITS):
+        raise ValueError('number may be outside the 64-bit range')
+    return orjson.loads(content)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that serializes with orjson when the output would be identical
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not enabled() or self.ensure_ascii or not self.compact or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. an integer beyond 64 bits or a type only DRF's encoder rejects; let DRF render or raise
+            return super().render(data, accepted_media_type, renderer_context)
+        if _SMALL_FLOAT in ret or _EXPONENT.search(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as JSONRenderer, so the output stays a strict javascript subset
+        if not ret.isascii() and b'\xe2\x80' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser that decodes UTF-8 bodies with orjson; invalid bodies get DRF's own parse error
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if not enabled() or encoding.lower() not in _UTF8:
+            return super().parse(stream, media_type, parser_context)
+        content = stream.read()
+        try:
+            return loads(content)
+        except ValueError:
+            return super().parse(io.BytesIO(content), media_type, parser_context)
+
+
+def decode_response(response):
+    """
+    Decode a gateway reply (requests or httpx) once from its bytes, falling back to response.json()
+    """
+    if enabled() and (response.encoding or 'utf-8').lower() in _UTF8:
+        try:
+            return loads(response.content)
+        except ValueError:
+            pass
+    return response.json()
+
+
+def get_renderer_classes():
+    """
+    DRF's default renderer classes with JSONRenderer replaced by FastJSONRenderer
+    """
+    return [FastJSONRenderer if renderer is JSONRenderer else renderer for renderer in api_settings.DEFAULT_RENDERER_CLASSES]
+
+
+def get_parser_classes():
+    """
+    DRF's default parser classes with JSONParser replaced by FastJSONParser
+    """
+    return [FastJSONParser if parser is JSONParser else parser for parser in api_settings.DEFAULT_PARSER_CLASSES]
@@ -0,0 +1,126 @@
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .client import TRANSACTION_STATUS, get_async_gateway_client, get_gateway_client
+from .models import NpsTransaction
+from .serializers import TransactionStatusResponseSerializer, validate_gateway_response
+
+
+def _parse_amount(value):
+    try:
+        return Decimal(value)
+    except (InvalidOperation, TypeError):
+        return None
+
+
+def record_process_id(merchant_id, payload, process_id, transaction_remarks='', instrument_code='', window=0):
+    """
+    Store the ProcessId issued for a merchant transaction and return the stored row.
+
+    With a window, a ProcessId another process recorded within window seconds is
+    kept and its row returned instead, so concurrent requests across processes
+    settle on one ProcessId.
+    """
+    lookup = {'merchant_id': merchant_id, 'merchant_txn_id': payload["MerchantTxnId"]}
+    now = timezone.now()
+    fields = {
+        'process_id': process_id,
+        'amount': _parse_amount(payload["Amount"]),
+        'transaction_remarks': transaction_remarks or '',
+        'instrument_code': instrument_code or '',
+        'updated_at': now,
+    }
+    rows = NpsTransaction.objects.filter(**lookup)
+    if window:
+        rows = rows.filter(Q(process_id='') | Q(updated_at__lt=now - timedelta(seconds=window)))
+    if rows.update(**fields):
+        return NpsTransaction.objects.get(**lookup)
+    try:
+        with db_transaction.atomic():
+            return NpsTransaction.objects.create(**lookup, **fields)
+    except IntegrityError:
+        # The row exists with a ProcessId issued inside the window, possibly by another process a moment ago
+        return NpsTransaction.objects.get(**lookup)
+
+
+def record_transaction_status(merchant_id, response, gateway_txn_id=''):
+    """
+    Store a validated CheckTransactionStatus response; a terminal status is never replaced by Pending
+    """
+    data = response["data"]
+    fields = {
+        'process_id': data["ProcessId"],
+        'gateway_reference_no': data["GatewayReferenceNo"],
+        'status': data["Status"],
+        'status_response': response,
+        'updated_at': timezone.now(),
+    }
+    if gateway_txn_id:
+        fields['gateway_txn_id'] = gateway_txn_id
+
+    transaction, created = NpsTransaction.objects.get_or_create(
+        merchant_id=merchant_id,
+        merchant_txn_id=data["MerchantTxnId"],
+        defaults={**fields, 'amount': _parse_amount(data["Amount"])}
+    )
+    if not created and not (transaction.is_terminal and fields['status'] not in NpsTransaction.TERMINAL_STATUSES):
+        for name, value in fields.items():
+            setattr(transaction, name, value)
+        transaction.save(update_fields=list(fields))
+    return transaction
+
+
+def get_issued_transaction(merchant_id, merchant_txn_id, window):
+    """
+    Return the transaction when it already has a ProcessId issued within window seconds, or has completed
+    """
+    transaction = NpsTransaction.objects.filter(merchant_id=merchant_id, merchant_txn_id=merchant_txn_id).exclude(process_id='').first()
+    if transaction is None:
+        return None
+    if transaction.is_terminal or transaction.updated_at >= timezone.now() - timedelta(seconds=window):
+        return transaction
+    return None
+
+
+def get_terminal_transaction(merchant_id, merchant_txn_id):
+    """
+    Return the stored transaction when it has reached Success or Fail, otherwise None
+    """
+    return NpsTransaction.objects.filter(
+        merchant_id=merchant_id,
+        merchant_txn_id=merchant_txn_id,
+        status__in=NpsTransaction.TERMINAL_STATUSES,
+        status_response__isnull=False,
+    ).first()
+
+
+def check_transaction_status(signer, merchant_txn_id, gateway_txn_id='', post=None):
+    """
+    Call CheckTransactionStatus and record a valid answer in the ledger.
+
+    Returns (validated data or None, raw response).
+    """
+    payload = signer.build_payload(TRANSACTION_STATUS, MerchantTxnId=merchant_txn_id)
+    response_data = (post or get_gateway_client().post)(TRANSACTION_STATUS, payload, signer.headers)
+    return _record_status_response(signer.merchant_id, response_data, gateway_txn_id)
+
+
+async def acheck_transaction_status(signer, merchant_txn_id, gateway_txn_id='', post=None):
+    """
+    Async variant of check_transaction_status; post is a coroutine function, by default the async client's
+    """
+    payload = signer.build_payload(TRANSACTION_STATUS, MerchantTxnId=merchant_txn_id)
+    response_data = await (post or get_async_gateway_client().post)(TRANSACTION_STATUS, payload, signer.headers)
+    return await sync_to_async(_record_status_response)(signer.merchant_id, response_data, gateway_txn_id)
+
+
+def _record_status_response(merchant_id, response_data, gateway_txn_id):
+    data = validate_gateway_response(response_data, TransactionStatusResponseSerializer)
+    if data is not None and data.get("data"):
+        record_transaction_status(merchant_id, data, gateway_txn_id)
+    return data, response_data
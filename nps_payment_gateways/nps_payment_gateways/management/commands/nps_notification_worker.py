@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from nps_payment_gateways.notifications import run_worker
+
+
+class Command(BaseCommand):
+    help = "Verify queued NPS payment notifications with CheckTransactionStatus."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Concurrent status checks.")
+        parser.add_argument('--batch-size', type=int, default=50, help="Notifications claimed per poll.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit once no notifications are due.")
+
+    def report(self, count):
+        self.stdout.write(self.style.SUCCESS(f"Processed {count} notification(s)."))
+
+    def handle(self, *args, **options):
+        processed = run_worker(
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            interval=options['interval'],
+            once=options['once'],
+            on_batch=self.report,
+        )
+        if not processed:
+            self.report(0)
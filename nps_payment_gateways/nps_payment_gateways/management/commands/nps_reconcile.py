@@ -0,0 +1,146 @@
+import json
+import os
+import sys
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from nps_payment_gateways.conf import get_setting
+from nps_payment_gateways.merchants import load_merchant_config
+from nps_payment_gateways.models import NpsTransaction
+from nps_payment_gateways.reconcile import check_statuses, to_ndjson
+from nps_payment_gateways.resilience import RateLimiter
+from nps_payment_gateways.signing import get_signer
+
+
+def _read_ids(lines):
+    for line in lines:
+        merchant_txn_id = line.strip()
+        if merchant_txn_id:
+            yield merchant_txn_id
+
+
+def _read_file(path):
+    with open(path) as f:
+        yield from _read_ids(f)
+
+
+def _settled_ids(path):
+    """
+    Return the merchant_txn_ids an earlier run already settled as Success or Fail
+    """
+    settled = set()
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # A line cut short by an interrupted run
+                    continue
+                if result.get("code") == "0" and result.get("status") in NpsTransaction.TERMINAL_STATUSES:
+                    settled.add(result["merchant_txn_id"])
+    except FileNotFoundError:
+        pass
+    return settled
+
+
+def _ends_mid_line(path):
+    """
+    Whether the file's last line was cut short, i.e. it does not end in a newline
+    """
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b'\n'
+    except FileNotFoundError:
+        return False
+
+
+class Command(BaseCommand):
+    help = "Check the status of many NPS transactions concurrently and write one NDJSON result per transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument('merchant_txn_ids', nargs='*', help="Transactions to check.")
+        parser.add_argument('--file', help="File with one merchant_txn_id per line, - for stdin.")
+        parser.add_argument('--pending', action='store_true', help="Check every ledger transaction that is not Success or Fail.")
+        parser.add_argument('--merchant-id', help="Merchant whose configuration is used; defaults to the first one.")
+        parser.add_argument('--output', help="NDJSON file for the results; defaults to stdout.")
+        parser.add_argument('--resume', action='store_true', help="Skip transactions already settled in --output and append to it.")
+        parser.add_argument('--concurrency', type=int, default=get_setting('NPS_BULK_STATUS_WORKERS'),
+                            help="Concurrent status checks; defaults to NPS_BULK_STATUS_WORKERS.")
+        parser.add_argument('--rate', type=float, default=get_setting('NPS_BULK_STATUS_RATE'),
+                            help="Gateway calls per second, 0 for no limit; defaults to NPS_BULK_STATUS_RATE.")
+        parser.add_argument('--no-ledger', action='store_true', help="Ask the gateway even for transactions the ledger has settled.")
+
+    def get_merchant_txn_ids(self, options, merchant_id):
+        sources = []
+        if options['merchant_txn_ids']:
+            sources.append(options['merchant_txn_ids'])
+        if options['file'] == '-':
+            sources.append(_read_ids(sys.stdin))
+        elif options['file']:
+            sources.append(_read_file(options['file']))
+        if options['pending']:
+            sources.append(
+                NpsTransaction.objects.filter(merchant_id=merchant_id).exclude(
+                    status__in=NpsTransaction.TERMINAL_STATUSES
+                ).order_by('pk').values_list('merchant_txn_id', flat=True).iterator()
+            )
+        if not sources:
+            raise CommandError("Give merchant_txn_ids, --file or --pending.")
+
+        seen = set()
+        for source in sources:
+            for merchant_txn_id in source:
+                if merchant_txn_id not in seen:
+                    seen.add(merchant_txn_id)
+                    yield merchant_txn_id
+
+    def handle(self, *args, **options):
+        if options['resume'] and not options['output']:
+            raise CommandError("--resume needs --output.")
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+
+        config = load_merchant_config(options['merchant_id'])
+        if config is None:
+            raise CommandError("NPS configuration is missing.")
+        signer = get_signer(config)
+
+        merchant_txn_ids = self.get_merchant_txn_ids(options, config.merchant_id)
+        if options['resume']:
+            settled = _settled_ids(options['output'])
+            merchant_txn_ids = (merchant_txn_id for merchant_txn_id in merchant_txn_ids if merchant_txn_id not in settled)
+            self.stderr.write(f"Skipping {len(settled)} transaction(s) settled by an earlier run.")
+
+        output = open(options['output'], 'a' if options['resume'] else 'w') if options['output'] else None
+        if options['resume'] and _ends_mid_line(options['output']):
+            # Finish the line an interrupted run cut short, so it cannot swallow the first new result
+            output.write('\n')
+        counts = Counter()
+        try:
+            results = check_statuses(
+                signer,
+                merchant_txn_ids,
+                workers=options['concurrency'],
+                limiter=RateLimiter(options['rate']),
+                use_ledger=not options['no_ledger'],
+            )
+            for result in results:
+                if output is not None:
+                    output.write(to_ndjson(result))
+                    output.flush()
+                else:
+                    self.stdout.write(to_ndjson(result), ending='')
+                    self.stdout.flush()
+                counts[result.get("status") or "Error"] += 1
+        finally:
+            if output is not None:
+                output.close()
+
+        summary = ", ".join(f"{status}: {count}" for status, count in sorted(counts.items())) or "nothing to check"
+        self.stderr.write(self.style.SUCCESS(f"Checked {sum(counts.values())} transaction(s). {summary}."))
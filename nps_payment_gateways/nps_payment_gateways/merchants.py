@@ -0,0 +1,47 @@
+from .cache import config_cache, invalidate_payment_instruments
+from .charges import service_charge_cache
+from .models import NpsPayment
+from .signing import clear_signers
+
+# config_cache key for requests that do not name a merchant
+DEFAULT_MERCHANT_KEY = 'default'
+
+
+def merchant_cache_key(merchant_id=None):
+    return f"merchant:{merchant_id}" if merchant_id else DEFAULT_MERCHANT_KEY
+
+
+def load_merchant_config(merchant_id=None):
+    """
+    Return the NpsPayment row for merchant_id, or the first configuration when none is given.
+
+    Rows are kept in config_cache per merchant, so a warm lookup needs no query.
+    Returns None for an unknown merchant.
+    """
+    if merchant_id:
+        loader = lambda: NpsPayment.objects.filter(merchant_id=merchant_id).first()
+    else:
+        loader = lambda: NpsPayment.objects.order_by('pk').first()
+    return config_cache.get(loader, key=merchant_cache_key(merchant_id))
+
+
+def get_cached_merchant_config(merchant_id=None):
+    """
+    Return the cached configuration without touching the database, or None on a miss
+    """
+    return config_cache.get_cached(merchant_cache_key(merchant_id))
+
+
+def invalidate_merchant(merchant_id):
+    """
+    Drop everything cached for one merchant: its configuration, signer, payment instruments and service charges.
+
+    The default entry is dropped as well, since it may hold the same row. Only the
+    configuration reaches other processes, and only through a shared NPS_CONFIG_CACHE_ALIAS;
+    everything else is cleared in the calling process alone.
+    """
+    config_cache.invalidate(merchant_cache_key(merchant_id))
+    config_cache.invalidate(DEFAULT_MERCHANT_KEY)
+    clear_signers(merchant_id)
+    invalidate_payment_instruments(merchant_id)
+    service_charge_cache.invalidate(merchant_id)
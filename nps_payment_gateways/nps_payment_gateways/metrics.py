@@ -0,0 +1,276 @@
+"""
+In-process metrics for the gateway views.
+
+Enabled with NPS_METRICS_ENABLED. Views time their config, sign, upstream,
+validate and render phases; the gateway clients count upstream outcomes per
+endpoint and the caches count hits and misses. Everything is kept in a
+process-wide registry rendered in the Prometheus text format by MetricsView,
+and each observation is also passed to NPS_METRICS_CALLBACK when one is set.
+
+The metrics settings are read once and re-read when Django reports a setting
+change, so a disabled hook costs one global lookup.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .conf import get_setting
+
+# Metric name: (type, help text)
+METRICS = {
+    'nps_request_seconds': ('histogram', "Time from the start of a gateway view until its response is rendered."),
+    'nps_requests_total': ('counter', "Gateway view responses by HTTP status."),
+    'nps_phase_seconds': ('histogram', "Time spent in each phase of a gateway view."),
+    'nps_upstream_seconds': ('histogram', "Time spent calling a gateway endpoint, retries included."),
+    'nps_upstream_responses_total': ('counter', "Gateway call attempts by HTTP status or failure."),
+    'nps_upstream_timeouts_total': ('counter', "Gateway call attempts that timed out."),
+    'nps_admission_wait_seconds': ('histogram', "Time a gateway call waited for a bulkhead slot."),
+    'nps_cache_requests_total': ('counter', "Cache lookups by cache and result."),
+    'nps_audit_dropped_total': ('counter', "Gateway calls left out of the audit log because its queue was full or a write failed."),
+}
+
+_disabled = nullcontext()
+_current_view = contextvars.ContextVar('nps_current_view', default=None)
+
+_enabled = None
+_callback = None
+
+
+def enabled():
+    global _enabled
+    if _enabled is None:
+        _enabled = bool(get_setting('NPS_METRICS_ENABLED'))
+    return _enabled
+
+
+def get_callback():
+    global _callback
+    if _callback is None:
+        callback = get_setting('NPS_METRICS_CALLBACK')
+        if isinstance(callback, str):
+            callback = import_string(callback)
+        # False marks "no callback" so the setting is not read again
+        _callback = callback or False
+    return _callback
+
+
+@receiver(setting_changed)
+def _reload_settings(setting, **kwargs):
+    global _enabled, _callback
+    if setting.startswith('NPS_METRICS'):
+        _enabled = None
+        _callback = None
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of labelled counters and histograms
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(tuple(get_setting('NPS_METRICS_BUCKETS')))
+            histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """
+        Return every metric in the Prometheus text exposition format
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (histogram.buckets, list(histogram.counts), histogram.sum, histogram.count))
+                for key, histogram in self._histograms.items()
+            )
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            if kind == 'counter':
+                samples = [(labels, value) for (metric, labels), value in counters if metric == name]
+            else:
+                samples = [(labels, value) for (metric, labels), value in histograms if metric == name]
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if kind == 'counter':
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+                    continue
+                buckets, counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(float(bound))),))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total!r}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+registry = MetricsRegistry()
+
+
+def _emit(kind, name, labels, value):
+    callback = get_callback()
+    if callback:
+        try:
+            callback(kind, name, dict(labels), value)
+        except Exception:
+            # A broken metrics sink must never fail a payment request
+            pass
+
+
+def increment(name, amount=1, **labels):
+    if not enabled():
+        return
+    labels = tuple(labels.items())
+    registry.inc(name, labels, amount)
+    _emit('counter', name, labels, amount)
+
+
+def observe(name, value, **labels):
+    if not enabled():
+        return
+    labels = tuple(labels.items())
+    registry.observe(name, labels, value)
+    _emit('histogram', name, labels, value)
+
+
+@contextmanager
+def _timed(name, labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def phase(name):
+    """
+    Time a phase of the current gateway view; a no-op outside one or when metrics are disabled
+    """
+    view = _current_view.get()
+    if view is None or not enabled():
+        return _disabled
+    return _timed('nps_phase_seconds', {'view': view, 'phase': name})
+
+
+def upstream(endpoint):
+    """
+    Time a gateway call, counting it as the upstream phase of the current view
+    """
+    if not enabled():
+        return _disabled
+    return _upstream(endpoint, _current_view.get())
+
+
+@contextmanager
+def _upstream(endpoint, view):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe('nps_upstream_seconds', elapsed, endpoint=endpoint)
+        if view is not None:
+            observe('nps_phase_seconds', elapsed, view=view, phase='upstream')
+
+
+def upstream_response(endpoint, outcome):
+    """
+    Count one gateway call attempt; outcome is the HTTP status code or a failure name such as 'timeout'
+    """
+    if not enabled():
+        return
+    increment('nps_upstream_responses_total', endpoint=endpoint, status=str(outcome))
+    if outcome == 'timeout':
+        increment('nps_upstream_timeouts_total', endpoint=endpoint)
+
+
+def cache_lookup(cache, result):
+    if not enabled():
+        return
+    increment('nps_cache_requests_total', cache=cache, result=result)
+
+
+def start_view(view):
+    """
+    Mark the start of a gateway view; returns the state finish_view needs, or None when disabled
+    """
+    if not enabled():
+        return None
+    name = type(view).__name__
+    _current_view.set(name)
+    return name, time.perf_counter()
+
+
+def finish_view(state, response):
+    """
+    Record the request once the response is rendered, timing rendering as its own phase
+    """
+    if state is None:
+        return
+    _current_view.set(None)
+    name, start = state
+    rendered_from = time.perf_counter()
+
+    def record(response):
+        end = time.perf_counter()
+        observe('nps_phase_seconds', end - rendered_from, view=name, phase='render')
+        observe('nps_request_seconds', end - start, view=name)
+        increment('nps_requests_total', view=name, status=str(response.status_code))
+
+    if getattr(response, 'is_rendered', True):
+        record(response)
+    else:
+        response.add_post_render_callback(record)
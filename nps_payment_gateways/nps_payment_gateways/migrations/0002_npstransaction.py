@@ -0,0 +1,39 @@
+from django.db import migrations, models
+from django.utils import timezone
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nps_payment_gateways', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NpsTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('merchant_id', models.CharField(max_length=100)),
+                ('merchant_txn_id', models.CharField(max_length=50)),
+                ('process_id', models.CharField(blank=True, default='', max_length=100)),
+                ('gateway_reference_no', models.CharField(blank=True, default='', max_length=100)),
+                ('gateway_txn_id', models.CharField(blank=True, default='', max_length=100)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('instrument_code', models.CharField(blank=True, default='', max_length=255)),
+                ('transaction_remarks', models.CharField(blank=True, default='', max_length=255)),
+                ('status', models.CharField(choices=[('Initiated', 'Initiated'), ('Pending', 'Pending'), ('Success', 'Success'), ('Fail', 'Fail')], default='Initiated', max_length=20)),
+                ('status_response', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=timezone.now)),
+                ('updated_at', models.DateTimeField(default=timezone.now)),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint(fields=('merchant_id', 'merchant_txn_id'), name='nps_txn_merchant_txn_uniq'),
+                ],
+                'indexes': [
+                    models.Index(fields=['merchant_txn_id'], name='nps_txn_merchant_txn_idx'),
+                    models.Index(fields=['process_id'], name='nps_txn_process_id_idx'),
+                    models.Index(fields=['gateway_reference_no'], name='nps_txn_gateway_ref_idx'),
+                    models.Index(fields=['status', 'created_at'], name='nps_txn_status_created_idx'),
+                ],
+            },
+        ),
+    ]
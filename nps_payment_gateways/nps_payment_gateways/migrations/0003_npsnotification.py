@@ -0,0 +1,33 @@
+from django.db import migrations, models
+from django.utils import timezone
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nps_payment_gateways', '0002_npstransaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NpsNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('merchant_id', models.CharField(max_length=100)),
+                ('merchant_txn_id', models.CharField(max_length=50)),
+                ('gateway_txn_id', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('Queued', 'Queued'), ('Processing', 'Processing'), ('Done', 'Done'), ('Failed', 'Failed')], default='Queued', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.CharField(blank=True, default='', max_length=255)),
+                ('next_attempt_at', models.DateTimeField(default=timezone.now)),
+                ('created_at', models.DateTimeField(default=timezone.now)),
+                ('updated_at', models.DateTimeField(default=timezone.now)),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint(fields=('merchant_id', 'merchant_txn_id', 'gateway_txn_id'), name='nps_notification_uniq'),
+                ],
+                'indexes': [
+                    models.Index(fields=['status', 'next_attempt_at'], name='nps_notification_due_idx'),
+                ],
+            },
+        ),
+    ]
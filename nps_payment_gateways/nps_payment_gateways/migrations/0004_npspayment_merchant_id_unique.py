@@ -0,0 +1,14 @@
+from django.db import migrations, models
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nps_payment_gateways', '0003_npsnotification'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='npspayment',
+            name='merchant_id',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
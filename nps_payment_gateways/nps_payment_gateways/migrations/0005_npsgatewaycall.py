@@ -0,0 +1,32 @@
+from django.db import migrations, models
+from django.utils import timezone
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nps_payment_gateways', '0004_npspayment_merchant_id_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NpsGatewayCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('merchant_id', models.CharField(blank=True, default='', max_length=100)),
+                ('endpoint', models.CharField(max_length=50)),
+                ('merchant_txn_id', models.CharField(blank=True, default='', max_length=50)),
+                ('request_headers', models.JSONField(default=dict)),
+                ('request_payload', models.JSONField(blank=True, null=True)),
+                ('response', models.JSONField(blank=True, null=True)),
+                ('response_code', models.CharField(blank=True, default='', max_length=10)),
+                ('error_code', models.CharField(blank=True, default='', max_length=10)),
+                ('duration_ms', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(default=timezone.now)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['merchant_id', 'created_at'], name='nps_call_merchant_created_idx'),
+                    models.Index(fields=['merchant_txn_id'], name='nps_call_merchant_txn_idx'),
+                ],
+            },
+        ),
+    ]
@@ -2,7 +2,7 @@ from django.db import models
 from django.utils import timezone
 
 class NpsPayment(models.Model):
-    merchant_id = models.CharField(max_length=100)
+    merchant_id = models.CharField(max_length=255, unique=True)
     merchant_name = models.CharField(max_length=255)
     api_username = models.CharField(max_length=100)
     api_password = models.CharField(max_length=100)
@@ -15,3 +15,104 @@ class NpsPayment(models.Model):
         return f"{self.merchant_name} ({self.merchant_id})"
 
 
+class NpsTransaction(models.Model):
+    STATUS_INITIATED = 'Initiated'
+    STATUS_PENDING = 'Pending'
+    STATUS_SUCCESS = 'Success'
+    STATUS_FAIL = 'Fail'
+    STATUS_CHOICES = [
+        (STATUS_INITIATED, 'Initiated'),
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SUCCESS, 'Success'),
+        (STATUS_FAIL, 'Fail'),
+    ]
+    TERMINAL_STATUSES = (STATUS_SUCCESS, STATUS_FAIL)
+
+    merchant_id = models.CharField(max_length=100)
+    merchant_txn_id = models.CharField(max_length=50)
+    process_id = models.CharField(max_length=100, blank=True, default='')
+    gateway_reference_no = models.CharField(max_length=100, blank=True, default='')
+    gateway_txn_id = models.CharField(max_length=100, blank=True, default='')
+    amount = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    instrument_code = models.CharField(max_length=255, blank=True, default='')
+    transaction_remarks = models.CharField(max_length=255, blank=True, default='')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_INITIATED)
+    status_response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['merchant_id', 'merchant_txn_id'], name='nps_txn_merchant_txn_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['merchant_txn_id'], name='nps_txn_merchant_txn_idx'),
+            models.Index(fields=['process_id'], name='nps_txn_process_id_idx'),
+            models.Index(fields=['gateway_reference_no'], name='nps_txn_gateway_ref_idx'),
+            models.Index(fields=['status', 'created_at'], name='nps_txn_status_created_idx'),
+        ]
+
+    @property
+    def is_terminal(self):
+        return self.status in self.TERMINAL_STATUSES
+
+    def __str__(self):
+        return f"{self.merchant_txn_id} ({self.status})"
+
+class NpsNotification(models.Model):
+    STATUS_QUEUED = 'Queued'
+    STATUS_PROCESSING = 'Processing'
+    STATUS_DONE = 'Done'
+    STATUS_FAILED = 'Failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    merchant_id = models.CharField(max_length=100)
+    merchant_txn_id = models.CharField(max_length=50)
+    gateway_txn_id = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True, default='')
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['merchant_id', 'merchant_txn_id', 'gateway_txn_id'],
+                name='nps_notification_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='nps_notification_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.merchant_txn_id}/{self.gateway_txn_id} ({self.status})"
+
+
+class NpsGatewayCall(models.Model):
+    merchant_id = models.CharField(max_length=100, blank=True, default='')
+    endpoint = models.CharField(max_length=50)
+    merchant_txn_id = models.CharField(max_length=50, blank=True, default='')
+    request_headers = models.JSONField(default=dict)
+    request_payload = models.JSONField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    response_code = models.CharField(max_length=10, blank=True, default='')
+    error_code = models.CharField(max_length=10, blank=True, default='')
+    duration_ms = models.FloatField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['merchant_id', 'created_at'], name='nps_call_merchant_created_idx'),
+            models.Index(fields=['merchant_txn_id'], name='nps_call_merchant_txn_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.merchant_txn_id} ({self.response_code or self.error_code})"
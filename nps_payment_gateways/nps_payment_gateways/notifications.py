@@ -0,0 +1,127 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .client import get_gateway_client
+from .conf import get_setting
+from .ledger import check_transaction_status
+from .merchants import load_merchant_config
+from .models import NpsNotification
+from .resilience import PRIORITY_HIGH
+from .signing import get_signer
+
+
+def enqueue_notification(merchant_id, merchant_txn_id, gateway_txn_id):
+    """
+    Durably queue a gateway notification for status verification.
+
+    Returns False when the same (merchant_txn_id, gateway_txn_id) was already queued.
+    """
+    try:
+        _, created = NpsNotification.objects.get_or_create(
+            merchant_id=merchant_id,
+            merchant_txn_id=merchant_txn_id,
+            gateway_txn_id=gateway_txn_id,
+        )
+    except IntegrityError:
+        # A concurrent delivery of the same notification won the insert
+        return False
+    return created
+
+
+def claim_notifications(batch_size):
+    """
+    Mark up to batch_size due notifications as processing and return them.
+
+    Processing rows whose lease expired, e.g. after a worker crash, are claimed again.
+    """
+    now = timezone.now()
+    lease_expired = now - timedelta(seconds=get_setting('NPS_NOTIFICATION_LEASE'))
+    with transaction.atomic():
+        due = NpsNotification.objects.select_for_update(
+            skip_locked=connection.features.has_select_for_update_skip_locked
+        ).filter(
+            Q(status=NpsNotification.STATUS_QUEUED, next_attempt_at__lte=now) |
+            Q(status=NpsNotification.STATUS_PROCESSING, updated_at__lt=lease_expired)
+        ).order_by('next_attempt_at')
+        ids = list(due.values_list('pk', flat=True)[:batch_size])
+        NpsNotification.objects.filter(pk__in=ids).update(
+            status=NpsNotification.STATUS_PROCESSING,
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+    return list(NpsNotification.objects.filter(pk__in=ids))
+
+
+def _finish(notification, status, error=''):
+    notification.status = status
+    notification.last_error = error[:255]
+    notification.updated_at = timezone.now()
+    if status == NpsNotification.STATUS_QUEUED:
+        backoff = get_setting('NPS_NOTIFICATION_RETRY_BACKOFF') * 2 ** max(notification.attempts - 1, 0)
+        notification.next_attempt_at = notification.updated_at + timedelta(seconds=backoff)
+    notification.save(update_fields=['status', 'last_error', 'updated_at', 'next_attempt_at'])
+
+
+def _retry_or_fail(notification, error):
+    if notification.attempts >= get_setting('NPS_NOTIFICATION_MAX_ATTEMPTS'):
+        _finish(notification, NpsNotification.STATUS_FAILED, error)
+    else:
+        _finish(notification, NpsNotification.STATUS_QUEUED, error)
+
+
+def process_notification(notification):
+    """
+    Verify one notification with CheckTransactionStatus and record the result in the ledger.
+
+    Gateway errors and Pending results are retried with exponential backoff until
+    NPS_NOTIFICATION_MAX_ATTEMPTS is reached.
+    """
+    close_old_connections()
+    try:
+        config = load_merchant_config(notification.merchant_id)
+        if config is None:
+            return _finish(notification, NpsNotification.STATUS_FAILED, "NPS configuration is missing.")
+
+        data, response_data = check_transaction_status(
+            get_signer(config),
+            notification.merchant_txn_id,
+            notification.gateway_txn_id,
+            post=partial(get_gateway_client().post, priority=PRIORITY_HIGH)
+        )
+        if data is not None and data.get("data") and data["data"]["Status"] != 'Pending':
+            return _finish(notification, NpsNotification.STATUS_DONE)
+
+        error = "Transaction is pending." if data is not None else response_data.get("message", "Unknown error occurred.")
+        _retry_or_fail(notification, error)
+    except Exception as e:
+        _retry_or_fail(notification, str(e) or e.__class__.__name__)
+    finally:
+        close_old_connections()
+
+
+def run_worker(workers=4, batch_size=50, interval=1.0, once=False, on_batch=None):
+    """
+    Claim and verify queued notifications with a pool of worker threads.
+
+    Returns the number of notifications processed. With once set it stops when no
+    more notifications are due, otherwise it runs until interrupted. on_batch is
+    called with the size of each non-empty batch once it has been processed.
+    """
+    processed = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='nps-notification') as pool:
+        while True:
+            batch = claim_notifications(batch_size)
+            list(pool.map(process_notification, batch))
+            processed += len(batch)
+            if batch and on_batch is not None:
+                on_batch(len(batch))
+            if len(batch) < batch_size:
+                if once:
+                    return processed
+                time.sleep(interval)
@@ -0,0 +1,241 @@
+"""
+Follow-up status checks for transactions the gateway reports as Pending.
+
+With NPS_PENDING_POLLING on, a status check that comes back Pending (or code
+'2') hands the transaction to the process-wide PendingPoller. It re-checks
+each one with exponential backoff until it reaches Success or Fail, which the
+ledger then answers, or until it gives up. Meanwhile status requests for a
+tracked transaction are answered from the poller instead of the gateway, so
+clients that poll do not add upstream calls.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.db import close_old_connections
+
+from .client import get_gateway_client
+from .conf import get_setting
+from .ledger import check_transaction_status
+from .merchants import load_merchant_config
+from .models import NpsTransaction
+from .resilience import PRIORITY_LOW
+from .signing import get_signer
+
+
+class PendingEntry:
+    __slots__ = ('merchant_id', 'merchant_txn_id', 'gateway_txn_id', 'response', 'attempts', 'tracked_at')
+
+    def __init__(self, merchant_id, merchant_txn_id, gateway_txn_id, response, now):
+        self.merchant_id = merchant_id
+        self.merchant_txn_id = merchant_txn_id
+        self.gateway_txn_id = gateway_txn_id
+        self.response = response
+        self.attempts = 0
+        self.tracked_at = now
+
+
+class PendingPoller:
+    """
+    Priority queue of pending transactions ordered by their next check.
+
+    One daemon thread waits for the earliest due check and hands it to a small
+    pool of workers. The n-th re-check runs about initial_delay * 2 ** (n - 1)
+    seconds after the previous one, capped at max_delay; a transaction is
+    dropped after max_attempts checks or give_up_after seconds.
+    """
+
+    def __init__(self, initial_delay, max_delay, max_attempts, give_up_after, workers, max_tracked):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.give_up_after = give_up_after
+        self.workers = workers
+        self.max_tracked = max_tracked
+        self._condition = threading.Condition()
+        self._queue = []
+        self._entries = {}
+        self._sequence = itertools.count()
+        self._thread = None
+        self._pool = None
+        self._stopped = False
+        self.checks = 0
+        self.given_up = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            initial_delay=get_setting('NPS_PENDING_POLL_INITIAL_DELAY'),
+            max_delay=get_setting('NPS_PENDING_POLL_MAX_DELAY'),
+            max_attempts=get_setting('NPS_PENDING_POLL_MAX_ATTEMPTS'),
+            give_up_after=get_setting('NPS_PENDING_POLL_GIVE_UP'),
+            workers=get_setting('NPS_PENDING_POLL_WORKERS'),
+            max_tracked=get_setting('NPS_PENDING_POLL_MAX_TRACKED'),
+        )
+
+    def delay(self, attempt):
+        """
+        Seconds before check number attempt (1-based), with 10% jitter so checks do not bunch up
+        """
+        return min(self.max_delay, self.initial_delay * 2 ** (attempt - 1)) * random.uniform(0.9, 1.1)
+
+    def track(self, merchant_id, merchant_txn_id, response, gateway_txn_id=''):
+        """
+        Start polling a pending transaction; an already tracked one only has its last response updated.
+
+        Returns False when max_tracked transactions are already being polled.
+        """
+        key = (merchant_id, merchant_txn_id)
+        with self._condition:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.response = response
+                return True
+            if len(self._entries) >= self.max_tracked:
+                return False
+            now = time.monotonic()
+            entry = self._entries[key] = PendingEntry(merchant_id, merchant_txn_id, gateway_txn_id, response, now)
+            self._schedule(entry, now)
+            self._start()
+        return True
+
+    def lookup(self, merchant_id, merchant_txn_id):
+        """
+        Return the last response seen for a tracked transaction, or None when it is not being polled
+        """
+        entry = self._entries.get((merchant_id, merchant_txn_id))
+        return entry.response if entry is not None else None
+
+    def snapshot(self):
+        with self._condition:
+            next_check = self._queue[0][0] - time.monotonic() if self._queue else None
+            return {
+                "tracked": len(self._entries),
+                "checks": self.checks,
+                "given_up": self.given_up,
+                "next_check_in": round(max(next_check, 0), 3) if next_check is not None else None,
+            }
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule(self, entry, now):
+        # Called with the condition held
+        heapq.heappush(self._queue, (now + self.delay(entry.attempts + 1), next(self._sequence), entry))
+        self._condition.notify()
+
+    def _start(self):
+        # Called with the condition held
+        if self._thread is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='nps-pending-check')
+            self._thread = threading.Thread(target=self._run, name='nps-pending-poller', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped and (not self._queue or self._queue[0][0] > time.monotonic()):
+                    self._condition.wait(self._queue[0][0] - time.monotonic() if self._queue else None)
+                if self._stopped:
+                    return
+                _, _, entry = heapq.heappop(self._queue)
+            self._pool.submit(self._check, entry)
+
+    def _check(self, entry):
+        data = response_data = None
+        merchant_missing = False
+        close_old_connections()
+        try:
+            config = load_merchant_config(entry.merchant_id)
+            if config is None:
+                merchant_missing = True
+            else:
+                data, response_data = check_transaction_status(
+                    get_signer(config),
+                    entry.merchant_txn_id,
+                    entry.gateway_txn_id,
+                    post=partial(get_gateway_client().post, priority=PRIORITY_LOW)
+                )
+        except Exception:
+            pass
+        finally:
+            close_old_connections()
+
+        with self._condition:
+            self.checks += 1
+            entry.attempts += 1
+            now = time.monotonic()
+            if data is not None and data.get("data") and data["data"]["Status"] in NpsTransaction.TERMINAL_STATUSES:
+                # The ledger has it now
+                self._entries.pop((entry.merchant_id, entry.merchant_txn_id), None)
+                return
+            if merchant_missing or entry.attempts >= self.max_attempts or now - entry.tracked_at >= self.give_up_after:
+                self._entries.pop((entry.merchant_id, entry.merchant_txn_id), None)
+                self.given_up += 1
+                return
+            if data is not None:
+                entry.response = data
+            elif response_data is not None and response_data.get("code") == "2":
+                entry.response = response_data
+            self._schedule(entry, now)
+
+
+def is_pending(data, response_data):
+    """
+    Whether a status check left the transaction pending: a valid non-final status, or code '2'
+    """
+    if data is not None:
+        return bool(data.get("data")) and data["data"]["Status"] not in NpsTransaction.TERMINAL_STATUSES
+    return response_data.get("code") == "2"
+
+
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def get_pending_poller():
+    """
+    Return the process-wide poller, building it from settings on first use
+    """
+    global _poller
+    if _poller is None:
+        with _poller_lock:
+            if _poller is None:
+                _poller = PendingPoller.from_settings()
+    return _poller
+
+
+def reset_pending_poller():
+    """
+    Stop the poller and forget every tracked transaction, e.g. after changing settings
+    """
+    global _poller
+    with _poller_lock:
+        if _poller is not None:
+            _poller.stop()
+        _poller = None
+
+
+def track_if_pending(merchant_id, merchant_txn_id, data, response_data, gateway_txn_id=''):
+    """
+    Hand a transaction left pending by a status check to the poller, when NPS_PENDING_POLLING is on
+    """
+    if get_setting('NPS_PENDING_POLLING') and is_pending(data, response_data):
+        get_pending_poller().track(merchant_id, merchant_txn_id, data if data is not None else response_data, gateway_txn_id)
+
+
+def lookup_pending(merchant_id, merchant_txn_id):
+    """
+    Return the poller's last response for a tracked transaction, or None
+    """
+    if not get_setting('NPS_PENDING_POLLING') or _poller is None:
+        return None
+    return _poller.lookup(merchant_id, merchant_txn_id)
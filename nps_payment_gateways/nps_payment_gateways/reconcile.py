@@ -0,0 +1,122 @@
+import json
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+from django.db import close_old_connections
+from rest_framework.utils.encoders import JSONEncoder
+
+from .client import get_gateway_client
+from .conf import get_setting
+from .ledger import check_transaction_status, get_terminal_transaction
+from .resilience import PRIORITY_LOW, RateLimiter
+from .streaming import aiterate
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_status_rate_limiter():
+    """
+    Return the process-wide limiter for bulk CheckTransactionStatus calls, sized by NPS_BULK_STATUS_RATE
+    """
+    global _limiter
+    rate = get_setting('NPS_BULK_STATUS_RATE')
+    if _limiter is None or _limiter.rate != rate:
+        with _limiter_lock:
+            if _limiter is None or _limiter.rate != rate:
+                _limiter = RateLimiter(rate)
+    return _limiter
+
+
+def _status_result(merchant_txn_id, response, source):
+    data = response.get("data") or {}
+    return {
+        "merchant_txn_id": merchant_txn_id,
+        "code": "0",
+        "status": data.get("Status"),
+        "source": source,
+        "data": data,
+    }
+
+
+def check_one_status(signer, merchant_txn_id, limiter=None, use_ledger=True):
+    """
+    Return the status result for one transaction; completed transactions are answered from the ledger
+    """
+    close_old_connections()
+    try:
+        if use_ledger:
+            transaction = get_terminal_transaction(signer.merchant_id, merchant_txn_id)
+            if transaction is not None:
+                return _status_result(merchant_txn_id, transaction.status_response, 'ledger')
+        if limiter is not None:
+            limiter.acquire()
+        data, response_data = check_transaction_status(
+            signer,
+            merchant_txn_id,
+            post=partial(get_gateway_client().post, priority=PRIORITY_LOW)
+        )
+        if data is not None:
+            return _status_result(merchant_txn_id, data, 'gateway')
+        return {
+            "merchant_txn_id": merchant_txn_id,
+            "code": "1",
+            "message": response_data.get("message", "Invalid data format received from payment server."),
+            "error_code": response_data.get("error_code", "500"),
+        }
+    except ValueError as e:
+        return {"merchant_txn_id": merchant_txn_id, "code": "1", "message": str(e), "error_code": "400"}
+    except Exception:
+        return {"merchant_txn_id": merchant_txn_id, "code": "1", "message": "Could not check transaction status.", "error_code": "500"}
+    finally:
+        close_old_connections()
+
+
+def check_statuses(signer, merchant_txn_ids, workers, limiter=None, use_ledger=True):
+    """
+    Check many transactions concurrently and yield each result as soon as it is ready.
+
+    merchant_txn_ids may be any iterable, e.g. the lines of a file; at most twice
+    workers checks are queued at a time. Closing the generator cancels the
+    checks that have not started.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='nps-reconcile') as pool:
+        pending = set()
+        try:
+            for merchant_txn_id in merchant_txn_ids:
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(pool.submit(check_one_status, signer, merchant_txn_id, limiter, use_ledger))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def to_ndjson(result):
+    return json.dumps(result, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def ndjson_lines(results):
+    """
+    Yield check_statuses results as NDJSON lines; closing it closes results, cancelling the checks not yet started
+    """
+    try:
+        for result in results:
+            yield to_ndjson(result)
+    finally:
+        results.close()
+
+
+def astream_ndjson(results):
+    """
+    Serve check_statuses results to an ASGI server as NDJSON lines, sending each as soon as it is ready
+    """
+    # Waiting on the checks blocks without touching the database, so keep it off the shared sync thread
+    return aiterate(ndjson_lines(results), thread_sensitive=False)
@@ -0,0 +1,314 @@
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from .conf import get_setting
+
+
+class RetryPolicy:
+    __slots__ = ('attempts', 'base_delay', 'max_delay')
+
+    def __init__(self, attempts=1, base_delay=0, max_delay=0):
+        self.attempts = max(int(attempts), 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        """
+        Full-jitter exponential delay before retry number attempt (1-based)
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class RateLimiter:
+    """
+    Token bucket shared by threads: acquire() blocks until one of rate tokens per second is free.
+
+    Up to burst tokens accumulate while idle. A rate of 0 or less never blocks.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+# Admission priorities, lowest value first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
+class Bulkhead:
+    """
+    Caps the concurrent calls to one gateway endpoint and queues the overflow.
+
+    Queued calls are admitted by priority, then in arrival order, as slots free
+    up. acquire() returns False when the queue is full or no slot frees up within
+    the timeout; every successful acquire() must be paired with release().
+    """
+
+    def __init__(self, limit, queue_size):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.active = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    def acquire(self, priority=PRIORITY_NORMAL, timeout=None):
+        with self._lock:
+            if self.active < self.limit:
+                self.active += 1
+                return True
+            if len(self._waiters) >= self.queue_size:
+                self.rejected += 1
+                return False
+            waiter = (priority, next(self._sequence), threading.Event())
+            heapq.heappush(self._waiters, waiter)
+        if waiter[2].wait(timeout):
+            return True
+        with self._lock:
+            # The slot may have been handed over just as the wait timed out
+            if waiter[2].is_set():
+                return True
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+            self.rejected += 1
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # Hand the slot straight to the next waiter, so active stays the same
+                heapq.heappop(self._waiters)[2].set()
+            else:
+                self.active -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return {"active": self.active, "queued": len(self._waiters), "rejected": self.rejected}
+
+
+class AsyncBulkhead(Bulkhead):
+    """
+    Bulkhead for the calls of one event loop; acquire() is a coroutine
+    """
+
+    async def acquire(self, priority=PRIORITY_NORMAL, timeout=None):
+        if self.active < self.limit:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.queue_size:
+            self.rejected += 1
+            return False
+        waiter = (priority, next(self._sequence), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter[2]), timeout)
+            return True
+        except asyncio.TimeoutError:
+            if waiter[2].done():
+                return True
+            self._remove(waiter)
+            self.rejected += 1
+            return False
+        except asyncio.CancelledError:
+            if waiter[2].done():
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+
+    def _remove(self, waiter):
+        self._waiters.remove(waiter)
+        heapq.heapify(self._waiters)
+
+    def release(self):
+        if self._waiters:
+            heapq.heappop(self._waiters)[2].set_result(None)
+        else:
+            self.active -= 1
+
+    def snapshot(self):
+        return {"active": self.active, "queued": len(self._waiters), "rejected": self.rejected}
+
+
+class AdmissionControl:
+    """
+    Admits gateway calls through the bulkhead of their endpoint, then one shared by all endpoints.
+
+    The endpoint bulkheads keep a burst on one endpoint from taking every shared
+    slot; the shared bulkhead admits waiting calls of all endpoints by priority.
+    A call that cannot get both slots within timeout seconds is rejected.
+    """
+    bulkhead_class = Bulkhead
+
+    def __init__(self, limit, queue_size, timeout, endpoints=None):
+        self.timeout = timeout
+        self.shared = self.bulkhead_class(limit, queue_size)
+        self.endpoints = {endpoint: self.bulkhead_class(**config) for endpoint, config in (endpoints or {}).items()}
+
+    def get_bulkheads(self, endpoint):
+        bulkhead = self.endpoints.get(endpoint)
+        return (self.shared,) if bulkhead is None else (bulkhead, self.shared)
+
+    def acquire(self, endpoint, priority, deadline):
+        """
+        Return the bulkheads to release once the call is done, or None when the call is rejected
+        """
+        give_up = min(time.monotonic() + self.timeout, deadline)
+        taken = []
+        for bulkhead in self.get_bulkheads(endpoint):
+            if not bulkhead.acquire(priority, max(give_up - time.monotonic(), 0)):
+                self.release(taken)
+                return None
+            taken.append(bulkhead)
+        return taken
+
+    def release(self, taken):
+        for bulkhead in reversed(taken):
+            bulkhead.release()
+
+    def snapshot(self):
+        return {"shared": self.shared.snapshot(), **{endpoint: bulkhead.snapshot() for endpoint, bulkhead in self.endpoints.items()}}
+
+
+class AsyncAdmissionControl(AdmissionControl):
+    """
+    Admission control for the calls of one event loop; acquire() is a coroutine
+    """
+    bulkhead_class = AsyncBulkhead
+
+    async def acquire(self, endpoint, priority, deadline):
+        give_up = min(time.monotonic() + self.timeout, deadline)
+        taken = []
+        try:
+            for bulkhead in self.get_bulkheads(endpoint):
+                if not await bulkhead.acquire(priority, max(give_up - time.monotonic(), 0)):
+                    self.release(taken)
+                    return None
+                taken.append(bulkhead)
+        except asyncio.CancelledError:
+            self.release(taken)
+            raise
+        return taken
+
+
+class CircuitBreaker:
+    """
+    Fails gateway calls fast after repeated transport failures.
+
+    Closed: calls pass and consecutive failures are counted. After
+    failure_threshold failures the breaker opens and rejects calls for
+    recovery_timeout seconds, then half-opens and lets a single probe through;
+    the probe's outcome closes or re-opens it. Every allowed call must report
+    record_success() or record_failure(). A threshold of 0 never opens.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold, recovery_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self._probing = False
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or 0 < self.failure_threshold <= self.failures:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "open_for": round(time.monotonic() - self.opened_at, 3) if self.opened_at is not None else None,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(endpoint):
+    """
+    Return the process-wide breaker for an endpoint, shared by the sync and async clients
+    """
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(endpoint)
+            if breaker is None:
+                breaker = _breakers[endpoint] = CircuitBreaker(
+                    endpoint,
+                    get_setting('NPS_BREAKER_FAILURE_THRESHOLD'),
+                    get_setting('NPS_BREAKER_RECOVERY_TIMEOUT'),
+                )
+    return breaker
+
+
+def breaker_states():
+    """
+    Return a snapshot of every breaker, keyed by endpoint, for monitoring
+    """
+    return {name: breaker.snapshot() for name, breaker in list(_breakers.items())}
+
+
+def reset_breakers():
+    """
+    Drop every breaker so the next call builds a closed one from current settings
+    """
+    with _breakers_lock:
+        _breakers.clear()
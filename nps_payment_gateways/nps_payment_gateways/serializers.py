@@ -1,5 +1,28 @@
 from rest_framework import serializers
+from rest_framework.settings import ISO_8601
+from . import metrics
+from .conf import get_setting
+from .export import EXPORT_FORMATS
 from .models import NpsPayment
+from .validators import get_compiled_serializer
+
+def validate_gateway_response(response_data, serializer_class):
+    """
+    Return the validated data of a successful gateway response, or None
+
+    With NPS_FAST_VALIDATION the compiled checker handles valid payloads; anything
+    it does not accept is validated by the serializer itself.
+    """
+    if response_data.get('code') == '0':
+        with metrics.phase('validate'):
+            if get_setting('NPS_FAST_VALIDATION'):
+                data = get_compiled_serializer(serializer_class).validate(response_data)
+                if data is not None:
+                    return data
+            serializer = serializer_class(data=response_data)
+            if serializer.is_valid():
+                return serializer.data
+    return None
 
 # Base Error Serializer
 class ErrorDetailSerializer(serializers.Serializer):
@@ -144,10 +167,35 @@ class TransactionStatusResponseSerializer(BaseResponseSerializer):
     def validate(self, data):
         return data
 
+class BulkTransactionStatusRequestSerializer(serializers.Serializer):
+    merchant_txn_ids = serializers.ListField(child=serializers.CharField(max_length=50), allow_empty=False)
+
+    def validate_merchant_txn_ids(self, value):
+        """
+        Drop duplicates and enforce NPS_BULK_STATUS_MAX_ITEMS
+        """
+        limit = get_setting('NPS_BULK_STATUS_MAX_ITEMS')
+        if len(value) > limit:
+            raise serializers.ValidationError(f"Ensure this list has no more than {limit} items.")
+        return list(dict.fromkeys(value))
+
+class ExportRequestSerializer(serializers.Serializer):
+    export_format = serializers.ChoiceField(choices=list(EXPORT_FORMATS), default='ndjson')
+    status = serializers.CharField(required=False, allow_blank=False, max_length=20)
+    created_from = serializers.DateTimeField(required=False, input_formats=[ISO_8601, '%Y-%m-%d'])
+    created_to = serializers.DateTimeField(required=False, input_formats=[ISO_8601, '%Y-%m-%d'])
+    after = serializers.IntegerField(required=False, min_value=0)
+
+    def validate(self, data):
+        if 'created_from' in data and 'created_to' in data and data['created_from'] >= data['created_to']:
+            raise serializers.ValidationError({"created_to": "Must be later than created_from."})
+        return data
+
 # Notification Serializers
 class NotificationRequestSerializer(serializers.Serializer):
-    merchant_txn_id = serializers.CharField(required=True, allow_blank=False)
-    gateway_txn_id = serializers.CharField(required=True, allow_blank=False)
+    # Lengths of the NpsNotification columns the deferred mode stores them in
+    merchant_txn_id = serializers.CharField(required=True, allow_blank=False, max_length=50)
+    gateway_txn_id = serializers.CharField(required=True, allow_blank=False, max_length=100)
 
 # NPS Payment Configuration Serializer
 class NpsPaymentSerializer(serializers.ModelSerializer):
@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .merchants import invalidate_merchant
+from .models import NpsPayment
+
+
+@receiver(pre_save, sender=NpsPayment)
+def remember_previous_merchant_id(sender, instance, **kwargs):
+    """
+    Note the stored merchant_id so a renamed merchant's old cache entries are dropped too
+    """
+    instance._previous_merchant_id = None
+    if instance.pk is not None:
+        instance._previous_merchant_id = NpsPayment.objects.filter(pk=instance.pk).values_list('merchant_id', flat=True).first()
+
+
+@receiver(post_save, sender=NpsPayment)
+@receiver(post_delete, sender=NpsPayment)
+def invalidate_nps_config(sender, instance, **kwargs):
+    """
+    Drop the merchant's cached configuration so rotated credentials apply to the next request.
+
+    Without a shared NPS_CONFIG_CACHE_ALIAS this only reaches the current
+    process; others pick up the change when their entry expires.
+    """
+    invalidate_merchant(instance.merchant_id)
+    previous = getattr(instance, '_previous_merchant_id', None)
+    if previous and previous != instance.merchant_id:
+        invalidate_merchant(previous)
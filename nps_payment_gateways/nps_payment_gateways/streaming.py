@@ -0,0 +1,25 @@
+from asgiref.sync import sync_to_async
+
+_DONE = object()
+
+
+async def aiterate(iterator, thread_sensitive=True):
+    """
+    Serve a synchronous iterator to an ASGI server, reading each item in a worker thread.
+
+    Django buffers a synchronous iterator completely before sending it over ASGI.
+    Iterators that block between items without touching the database can pass
+    thread_sensitive=False so they do not hold up the shared sync thread. The
+    iterator is closed when iteration stops early, e.g. when the client goes away.
+    """
+    next_item = sync_to_async(next, thread_sensitive=thread_sensitive)
+    try:
+        while True:
+            item = await next_item(iterator, _DONE)
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=thread_sensitive)()
@@ -0,0 +1,157 @@
+from decimal import ROUND_HALF_UP, Decimal
+from unittest import mock
+
+from django.test import override_settings
+from rest_framework import status
+
+from nps_payment_gateways.client import SERVICE_CHARGE
+
+from .utils import FakeGateway, GatewayTestCase
+
+
+def percentage(rate):
+    return lambda amount: ('Percentage', rate, amount * rate / 100)
+
+
+def slab(*bands):
+    """
+    Flat charge of the first band whose upper bound covers the amount
+    """
+    def price(amount):
+        charge = next(charge for upper, charge in bands if amount <= upper)
+        return 'Flat', charge, charge
+    return price
+
+
+PRICING = {
+    'PERCENT': percentage(Decimal('1.5')),
+    'FLAT': slab((Decimal('Infinity'), Decimal('10'))),
+    'SLAB': slab((Decimal('1000'), Decimal('10')), (Decimal('Infinity'), Decimal('25'))),
+}
+
+
+def service_charge_reply(payload):
+    amount = Decimal(payload['Amount'])
+    commission_type, charge_value, total = PRICING[payload['InstrumentCode']](amount)
+    return {
+        "code": "0",
+        "message": "Success",
+        "errors": [],
+        "data": {
+            "Amount": payload['Amount'],
+            "CommissionType": commission_type,
+            "ChargeValue": str(charge_value),
+            "TotalChargeAmount": str(total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
+        },
+    }
+
+
+@override_settings(NPS_SERVICE_CHARGE_LOCAL_COMPUTE=True, NPS_SERVICE_CHARGE_REVERIFY_INTERVAL=600)
+class LocalServiceChargeTests(GatewayTestCase):
+    def setUp(self):
+        super().setUp()
+        self.gateway = FakeGateway(**{SERVICE_CHARGE: service_charge_reply})
+        patcher = mock.patch('nps_payment_gateways.views.get_gateway_client', return_value=self.gateway)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def quote(self, amount, instrument='PERCENT'):
+        response = self.client.post('/service-charge/', {'amount': amount, 'payment_instrument_id': instrument}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["data"]["data"]
+
+    def gateway_quote(self, amount, instrument='PERCENT'):
+        return service_charge_reply({'Amount': f'{Decimal(amount):.2f}', 'InstrumentCode': instrument})["data"]
+
+    def learn(self, instrument, *amounts):
+        for amount in amounts:
+            self.quote(amount, instrument)
+        self.assertEqual(self.gateway.count(SERVICE_CHARGE), len(amounts))
+
+    def assertQuotedLocally(self, amount, instrument='PERCENT'):
+        calls = self.gateway.count(SERVICE_CHARGE)
+        data = self.quote(amount, instrument)
+        self.assertEqual(self.gateway.count(SERVICE_CHARGE), calls)
+        self.assertEqual({key: str(value) for key, value in data.items()}, self.gateway_quote(amount, instrument))
+
+    def assertQuotedByGateway(self, amount, instrument='PERCENT'):
+        calls = self.gateway.count(SERVICE_CHARGE)
+        self.quote(amount, instrument)
+        self.assertEqual(self.gateway.count(SERVICE_CHARGE), calls + 1)
+
+    @override_settings(NPS_SERVICE_CHARGE_LOCAL_COMPUTE=False)
+    def test_off_by_default_every_new_amount_goes_to_the_gateway(self):
+        self.learn('PERCENT', '100', '1000')
+
+        self.assertQuotedByGateway('500')
+        self.assertQuotedByGateway('500.50')
+
+    def test_repeated_amount_is_served_from_the_quote_cache(self):
+        self.learn('PERCENT', '100')
+
+        self.assertEqual(self.quote('100'), self.quote('100'))
+        self.assertEqual(self.gateway.count(SERVICE_CHARGE), 1)
+
+    def test_percentage_inside_the_confirmed_range_matches_the_gateway(self):
+        self.learn('PERCENT', '100', '1000')
+
+        for amount in ('100.00', '200', '500', '998', '1000.00'):
+            with self.subTest(amount=amount):
+                self.assertQuotedLocally(amount)
+
+    def test_flat_inside_the_confirmed_range_matches_the_gateway(self):
+        self.learn('FLAT', '50', '5000')
+
+        self.assertQuotedLocally('50.01', 'FLAT')
+        self.assertQuotedLocally('4999.99', 'FLAT')
+
+    def test_amount_outside_the_confirmed_range_goes_to_the_gateway(self):
+        self.learn('PERCENT', '100', '1000')
+
+        self.assertQuotedByGateway('99')
+        self.assertQuotedByGateway('2000')
+        # The gateway confirmed the rule at 2000, so the range now reaches it
+        self.assertQuotedLocally('1500')
+
+    def test_single_quote_only_covers_its_own_amount(self):
+        self.learn('PERCENT', '100')
+
+        self.assertQuotedByGateway('200')
+
+    def test_slab_pricing_is_not_extrapolated(self):
+        self.learn('SLAB', '100', '1000')
+        self.assertQuotedLocally('500', 'SLAB')
+
+        data = self.quote('1500', 'SLAB')
+        self.assertEqual(self.gateway.count(SERVICE_CHARGE), 3)
+        self.assertEqual(data["TotalChargeAmount"], '25.00')
+        # The next slab disagrees with the learned rule, which is dropped
+        self.assertQuotedByGateway('700', 'SLAB')
+
+    def test_amount_that_needs_rounding_goes_to_the_gateway(self):
+        self.learn('PERCENT', '100', '1000')
+
+        self.assertQuotedByGateway('100.01')
+        # The gateway's rounded quote leaves the rule in place
+        self.assertQuotedLocally('300')
+
+    def test_disagreeing_quote_replaces_the_rule(self):
+        self.learn('PERCENT', '100', '1000')
+        PRICING['PERCENT'], original = percentage(Decimal('2')), PRICING['PERCENT']
+        self.addCleanup(PRICING.__setitem__, 'PERCENT', original)
+
+        self.assertQuotedByGateway('2000')
+        self.assertQuotedByGateway('500')
+        self.assertQuotedLocally('1000.50')
+
+    @override_settings(NPS_SERVICE_CHARGE_REVERIFY_INTERVAL=0)
+    def test_rule_older_than_the_reverify_interval_is_not_used(self):
+        self.learn('PERCENT', '100', '1000')
+
+        self.assertQuotedByGateway('500')
+
+    def test_rules_are_kept_per_merchant_and_instrument(self):
+        self.learn('PERCENT', '100', '1000')
+
+        self.assertQuotedByGateway('100', 'FLAT')
+        self.assertQuotedByGateway('500', 'FLAT')
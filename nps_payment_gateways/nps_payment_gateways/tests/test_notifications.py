@@ -0,0 +1,149 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import status
+
+from nps_payment_gateways.client import TRANSACTION_STATUS
+from nps_payment_gateways.models import NpsNotification, NpsTransaction
+from nps_payment_gateways.notifications import claim_notifications, enqueue_notification, process_notification
+
+from .utils import FakeGateway, GatewayTestCase
+
+
+def status_reply(payload, transaction_status):
+    return {
+        "code": "0",
+        "message": "Success",
+        "errors": [],
+        "data": {
+            "GatewayReferenceNo": f"REF-{payload['MerchantTxnId']}",
+            "Amount": "100",
+            "ServiceCharge": "1.5",
+            "TransactionRemarks": "order",
+            "ProcessId": f"PID-{payload['MerchantTxnId']}",
+            "TransactionDate": "2026-01-01 10:00:00",
+            "MerchantTxnId": payload["MerchantTxnId"],
+            "CbsMessage": "",
+            "Status": transaction_status,
+            "Institution": "Bank",
+            "Instrument": "Internet Banking",
+            "PaymentCurrency": "NPR",
+            "ExchangeRate": "1",
+        },
+    }
+
+
+@override_settings(
+    NPS_NOTIFICATION_MODE='deferred',
+    NPS_NOTIFICATION_LEASE=300,
+    NPS_NOTIFICATION_RETRY_BACKOFF=30,
+    NPS_NOTIFICATION_MAX_ATTEMPTS=3,
+)
+class NotificationQueueTests(GatewayTestCase):
+    def setUp(self):
+        super().setUp()
+        self.transaction_status = 'Success'
+        self.gateway = FakeGateway(**{TRANSACTION_STATUS: lambda payload: status_reply(payload, self.transaction_status)})
+        for target in ('nps_payment_gateways.views.get_gateway_client', 'nps_payment_gateways.notifications.get_gateway_client'):
+            patcher = mock.patch(target, return_value=self.gateway)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def enqueue(self, merchant_txn_id='TXN0001', gateway_txn_id='GW1'):
+        return enqueue_notification(self.merchant.merchant_id, merchant_txn_id, gateway_txn_id)
+
+    def test_deferred_notification_is_acknowledged_without_a_gateway_call(self):
+        response = self.client.post('/notification/', {'merchant_txn_id': 'TXN0001', 'gateway_txn_id': 'GW1'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(NpsNotification.objects.get().status, NpsNotification.STATUS_QUEUED)
+        self.assertEqual(self.gateway.calls, [])
+
+    def test_repeated_delivery_is_queued_once(self):
+        self.assertTrue(self.enqueue())
+        self.assertFalse(self.enqueue())
+        for _ in range(2):
+            self.client.post('/notification/', {'merchant_txn_id': 'TXN0001', 'gateway_txn_id': 'GW1'}, format='json')
+
+        self.assertEqual(NpsNotification.objects.count(), 1)
+        self.assertTrue(self.enqueue(gateway_txn_id='GW2'))
+
+    def test_oversized_ids_are_rejected(self):
+        response = self.client.post('/notification/', {'merchant_txn_id': 'T' * 51, 'gateway_txn_id': 'GW1'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(NpsNotification.objects.exists())
+
+    def test_claim_marks_notifications_processing_once(self):
+        self.enqueue('TXN0001')
+        self.enqueue('TXN0002')
+
+        claimed = claim_notifications(10)
+
+        self.assertEqual(len(claimed), 2)
+        self.assertTrue(all(n.status == NpsNotification.STATUS_PROCESSING and n.attempts == 1 for n in claimed))
+        self.assertEqual(claim_notifications(10), [])
+
+    def test_claim_respects_the_batch_size(self):
+        for i in range(3):
+            self.enqueue(f'TXN{i:04d}')
+
+        self.assertEqual(len(claim_notifications(2)), 2)
+        self.assertEqual(len(claim_notifications(2)), 1)
+
+    def test_notification_not_yet_due_is_not_claimed(self):
+        self.enqueue()
+        NpsNotification.objects.update(next_attempt_at=timezone.now() + timedelta(seconds=60))
+
+        self.assertEqual(claim_notifications(10), [])
+
+    def test_expired_lease_is_claimed_again(self):
+        self.enqueue()
+        claim_notifications(10)
+        NpsNotification.objects.update(updated_at=timezone.now() - timedelta(seconds=299))
+        self.assertEqual(claim_notifications(10), [])
+
+        NpsNotification.objects.update(updated_at=timezone.now() - timedelta(seconds=301))
+        reclaimed = claim_notifications(10)
+
+        self.assertEqual(len(reclaimed), 1)
+        self.assertEqual(reclaimed[0].attempts, 2)
+
+    def test_settled_notification_is_done_and_recorded(self):
+        self.enqueue()
+        process_notification(claim_notifications(10)[0])
+
+        notification = NpsNotification.objects.get()
+        self.assertEqual(notification.status, NpsNotification.STATUS_DONE)
+        transaction = NpsTransaction.objects.get(merchant_txn_id='TXN0001')
+        self.assertEqual(transaction.status, NpsTransaction.STATUS_SUCCESS)
+        self.assertEqual(transaction.gateway_txn_id, 'GW1')
+
+    def test_pending_notification_is_retried_with_backoff(self):
+        self.transaction_status = 'Pending'
+        self.enqueue()
+        process_notification(claim_notifications(10)[0])
+
+        notification = NpsNotification.objects.get()
+        self.assertEqual(notification.status, NpsNotification.STATUS_QUEUED)
+        self.assertEqual(notification.next_attempt_at - notification.updated_at, timedelta(seconds=30))
+        self.assertEqual(notification.last_error, "Transaction is pending.")
+
+        NpsNotification.objects.update(next_attempt_at=timezone.now())
+        process_notification(claim_notifications(10)[0])
+        notification.refresh_from_db()
+        self.assertEqual(notification.next_attempt_at - notification.updated_at, timedelta(seconds=60))
+
+    def test_notification_fails_after_the_last_attempt(self):
+        self.transaction_status = 'Pending'
+        self.enqueue()
+        for _ in range(3):
+            NpsNotification.objects.update(next_attempt_at=timezone.now())
+            process_notification(claim_notifications(10)[0])
+
+        notification = NpsNotification.objects.get()
+        self.assertEqual(notification.status, NpsNotification.STATUS_FAILED)
+        self.assertEqual(notification.attempts, 3)
+        self.assertEqual(self.gateway.count(TRANSACTION_STATUS), 3)
@@ -0,0 +1,105 @@
+import itertools
+from datetime import timedelta
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import status
+
+from nps_payment_gateways.client import PROCESS_ID
+from nps_payment_gateways.models import NpsTransaction
+
+from .utils import FakeGateway, GatewayTestCase
+
+REQUEST = {'amount': '100', 'merchant_txn_id': 'TXN0001', 'TransactionRemarks': 'order 1', 'InstrumentCode': 'BANK0'}
+
+
+@override_settings(NPS_PROCESS_ID_IDEMPOTENCY_WINDOW=900)
+class ProcessIdIdempotencyTests(GatewayTestCase):
+    def setUp(self):
+        super().setUp()
+        process_ids = itertools.count(1)
+        self.gateway = FakeGateway(**{
+            PROCESS_ID: lambda payload: {"code": "0", "message": "Success", "errors": [], "data": {"ProcessId": f"PID-{next(process_ids)}"}},
+        })
+        patcher = mock.patch('nps_payment_gateways.views.get_gateway_client', return_value=self.gateway)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request_process_id(self, **changes):
+        return self.client.post('/process-id/', {**REQUEST, **changes}, format='json')
+
+    def test_repeated_request_gets_the_stored_process_id(self):
+        first = self.request_process_id()
+        second = self.request_process_id()
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data["data"]["ProcessId"], "PID-1")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(self.gateway.count(PROCESS_ID), 1)
+
+    def test_different_amount_is_a_conflict(self):
+        self.request_process_id()
+        response = self.request_process_id(amount='101')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["error_code"], "409")
+        self.assertEqual(self.gateway.count(PROCESS_ID), 1)
+
+    def test_different_remarks_is_a_conflict(self):
+        self.request_process_id()
+        response = self.request_process_id(TransactionRemarks='order 2')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_different_instrument_is_a_conflict(self):
+        self.request_process_id()
+        response = self.request_process_id(InstrumentCode='BANK1')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.gateway.count(PROCESS_ID), 1)
+
+    def test_completed_transaction_is_a_conflict(self):
+        self.request_process_id()
+        NpsTransaction.objects.filter(merchant_txn_id=REQUEST['merchant_txn_id']).update(status=NpsTransaction.STATUS_SUCCESS)
+        response = self.request_process_id()
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["message"], "Transaction has already been processed.")
+
+    def test_request_after_the_window_gets_a_new_process_id(self):
+        self.request_process_id()
+        NpsTransaction.objects.update(updated_at=timezone.now() - timedelta(seconds=901))
+        response = self.request_process_id()
+
+        self.assertEqual(response.data["data"]["ProcessId"], "PID-2")
+        self.assertEqual(NpsTransaction.objects.get().process_id, "PID-2")
+
+    @override_settings(NPS_PROCESS_ID_IDEMPOTENCY_WINDOW=0)
+    def test_without_a_window_every_request_asks_the_gateway(self):
+        self.request_process_id()
+        response = self.request_process_id(amount='200')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["data"]["ProcessId"], "PID-2")
+        self.assertEqual(self.gateway.count(PROCESS_ID), 2)
+
+    def test_process_id_stored_by_another_process_is_kept(self):
+        # Another process stored its ProcessId after this request found no row in the ledger
+        NpsTransaction.objects.create(
+            merchant_id=self.merchant.merchant_id,
+            merchant_txn_id=REQUEST['merchant_txn_id'],
+            process_id='PID-OTHER',
+            amount='100',
+            transaction_remarks=REQUEST['TransactionRemarks'],
+            instrument_code=REQUEST['InstrumentCode'],
+        )
+        with mock.patch('nps_payment_gateways.views.get_issued_transaction', return_value=None):
+            response = self.request_process_id()
+            conflict = self.request_process_id(amount='5')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["data"]["ProcessId"], "PID-OTHER")
+        self.assertEqual(conflict.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(NpsTransaction.objects.get().process_id, "PID-OTHER")
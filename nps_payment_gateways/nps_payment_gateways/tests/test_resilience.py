@@ -0,0 +1,231 @@
+import json
+from unittest import mock, skipIf
+
+import requests
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, override_settings
+
+from nps_payment_gateways.client import (
+    CONNECTION_ERROR,
+    PROCESS_ID,
+    SERVICE_CHARGE,
+    TIMEOUT_ERROR,
+    TRANSACTION_STATUS,
+    UNAVAILABLE_ERROR,
+    AsyncNpsGatewayClient,
+    NpsGatewayClient,
+)
+from nps_payment_gateways.resilience import CircuitBreaker, RetryPolicy, get_breaker, reset_breakers
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+OK = {"code": "0", "message": "Success", "errors": [], "data": {}}
+
+
+def http_response(status_code, body=OK):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(body).encode()
+    response.encoding = 'utf-8'
+    return response
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker('test', failure_threshold=3, recovery_timeout=30)
+
+    def open(self):
+        for _ in range(3):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+
+    def expire(self):
+        self.breaker.opened_at -= 30
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.rejected, 1)
+
+    def test_success_resets_the_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.failures, 1)
+
+    def test_half_opens_after_the_recovery_timeout_with_a_single_probe(self):
+        self.open()
+        self.expire()
+
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_probe_closes(self):
+        self.open()
+        self.expire()
+        self.breaker.allow()
+        self.breaker.record_success()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        self.open()
+        self.expire()
+        self.breaker.allow()
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_threshold_of_zero_never_opens(self):
+        breaker = CircuitBreaker('test', failure_threshold=0, recovery_timeout=30)
+        for _ in range(10):
+            breaker.record_failure()
+
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+
+@override_settings(NPS_BREAKER_FAILURE_THRESHOLD=5, NPS_BREAKER_RECOVERY_TIMEOUT=30, NPS_RETRY_POLICIES={})
+class RetryPolicyTests(SimpleTestCase):
+    def setUp(self):
+        reset_breakers()
+        self.addCleanup(reset_breakers)
+        patcher = mock.patch.object(RetryPolicy, 'backoff', return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = NpsGatewayClient('http://nps.invalid', 1, 1, False, 1, 1)
+        self.addCleanup(self.client.close)
+
+    def reply(self, *outcomes):
+        """
+        Answer successive session posts with outcomes: a status code, or an exception to raise
+        """
+        def post(*args, **kwargs):
+            outcome = next(replies)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return http_response(outcome)
+        replies = iter(outcomes)
+        self.session_post = mock.patch.object(self.client.session, 'post', side_effect=post).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def post(self, endpoint):
+        return self.client.post(endpoint, {"MerchantTxnId": "TXN0001"}, {})
+
+    def test_idempotent_endpoint_retries_a_gateway_503(self):
+        self.reply(503, 200)
+
+        self.assertEqual(self.post(SERVICE_CHARGE), OK)
+        self.assertEqual(self.session_post.call_count, 2)
+
+    def test_idempotent_endpoint_retries_a_connect_failure(self):
+        self.reply(requests.exceptions.ConnectionError(), requests.exceptions.ConnectTimeout(), 200)
+
+        self.assertEqual(self.post(TRANSACTION_STATUS), OK)
+        self.assertEqual(self.session_post.call_count, 3)
+
+    def test_retries_stop_after_the_policy_attempts(self):
+        self.reply(503, 503, 503, 200)
+
+        self.assertEqual(self.post(TRANSACTION_STATUS)["error_code"], "400")
+        self.assertEqual(self.session_post.call_count, 3)
+
+    def test_process_id_is_never_retried(self):
+        for outcome in (503, requests.exceptions.ConnectionError(), requests.exceptions.ConnectTimeout()):
+            with self.subTest(outcome=outcome):
+                self.reply(outcome, 200)
+                self.post(PROCESS_ID)
+                self.assertEqual(self.session_post.call_count, 1)
+
+    def test_read_timeout_is_not_retried(self):
+        self.reply(requests.exceptions.ReadTimeout(), 200)
+
+        self.assertEqual(self.post(SERVICE_CHARGE), TIMEOUT_ERROR)
+        self.assertEqual(self.session_post.call_count, 1)
+
+    def test_client_error_is_not_retried(self):
+        self.reply(400, 200)
+
+        self.assertEqual(self.post(SERVICE_CHARGE)["error_code"], "400")
+        self.assertEqual(self.session_post.call_count, 1)
+
+    @override_settings(NPS_RETRY_POLICIES={PROCESS_ID: {'attempts': 2}, SERVICE_CHARGE: {'attempts': 1}})
+    def test_settings_override_the_default_policies(self):
+        self.reply(503, 200)
+        self.assertEqual(self.post(PROCESS_ID), OK)
+        self.assertEqual(self.session_post.call_count, 2)
+
+        self.reply(503, 200)
+        self.post(SERVICE_CHARGE)
+        self.assertEqual(self.session_post.call_count, 1)
+
+    def test_open_breaker_fails_fast(self):
+        self.reply(*[requests.exceptions.ConnectionError()] * 5)
+        self.assertEqual(self.post(SERVICE_CHARGE), CONNECTION_ERROR)
+        # The fifth failure opens the breaker in the middle of the second call's retries
+        self.assertEqual(self.post(SERVICE_CHARGE), UNAVAILABLE_ERROR)
+        self.assertEqual(get_breaker(SERVICE_CHARGE).state, CircuitBreaker.OPEN)
+
+        self.assertEqual(self.post(SERVICE_CHARGE), UNAVAILABLE_ERROR)
+        self.assertEqual(self.session_post.call_count, 5)
+        self.assertEqual(get_breaker(TRANSACTION_STATUS).state, CircuitBreaker.CLOSED)
+
+    def test_breaker_counts_gateway_5xx_but_not_4xx(self):
+        self.reply(400, 500)
+        self.post(SERVICE_CHARGE)
+        self.assertEqual(get_breaker(SERVICE_CHARGE).failures, 0)
+
+        self.post(SERVICE_CHARGE)
+        self.assertEqual(get_breaker(SERVICE_CHARGE).failures, 1)
+
+
+@skipIf(httpx is None, "httpx is not installed")
+@override_settings(NPS_BREAKER_FAILURE_THRESHOLD=5, NPS_BREAKER_RECOVERY_TIMEOUT=30, NPS_RETRY_POLICIES={})
+class AsyncRetryPolicyTests(SimpleTestCase):
+    def setUp(self):
+        reset_breakers()
+        self.addCleanup(reset_breakers)
+        patcher = mock.patch.object(RetryPolicy, 'backoff', return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @async_to_sync
+    async def send(self, endpoint, *statuses):
+        replies = iter(statuses)
+        calls = []
+
+        def handle(request):
+            calls.append(request)
+            return httpx.Response(next(replies), json=OK)
+
+        client = AsyncNpsGatewayClient('http://nps.invalid', 1, 1, 1)
+        await client.client.aclose()
+        client.client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+        try:
+            return await client.post(endpoint, {"MerchantTxnId": "TXN0001"}, {}), len(calls)
+        finally:
+            await client.close()
+
+    def test_idempotent_endpoint_retries_a_gateway_503(self):
+        self.assertEqual(self.send(SERVICE_CHARGE, 503, 200), (OK, 2))
+
+    def test_process_id_is_never_retried(self):
+        result, calls = self.send(PROCESS_ID, 503, 200)
+
+        self.assertEqual(result["error_code"], "400")
+        self.assertEqual(calls, 1)
@@ -0,0 +1,50 @@
+import threading
+
+from rest_framework.test import APITestCase
+
+from nps_payment_gateways.cache import config_cache, invalidate_payment_instruments
+from nps_payment_gateways.charges import service_charge_cache
+from nps_payment_gateways.models import NpsPayment
+from nps_payment_gateways.resilience import reset_breakers
+from nps_payment_gateways.signing import clear_signers
+
+MERCHANT = {
+    'merchant_id': '7467',
+    'merchant_name': 'Test Shop',
+    'api_username': 'user',
+    'api_password': 'password',
+    'gateway_api_secret_key': 'secret',
+}
+
+
+class FakeGateway:
+    """
+    Stands in for the shared gateway client: records every call and answers it with the endpoint's handler
+    """
+
+    def __init__(self, **handlers):
+        self.handlers = handlers
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def post(self, endpoint, payload, headers, priority=None):
+        with self._lock:
+            self.calls.append((endpoint, dict(payload)))
+        return self.handlers[endpoint](payload)
+
+    def count(self, endpoint):
+        return sum(1 for called, _ in self.calls if called == endpoint)
+
+
+class GatewayTestCase(APITestCase):
+    """
+    Starts every test with one merchant and with the process-wide caches and breakers empty
+    """
+
+    def setUp(self):
+        config_cache.invalidate()
+        clear_signers()
+        invalidate_payment_instruments()
+        service_charge_cache.invalidate()
+        reset_breakers()
+        self.merchant = NpsPayment.objects.create(**MERCHANT)
@@ -6,6 +6,12 @@ from .views import (
     ProcessIdView,
     NotificationView,
     ServiceChargeView,
+    BatchServiceChargeView,
+    TransactionStatusView,
+    BulkTransactionStatusView,
+    ExportView,
+    GatewayStatusView,
+    MetricsView,
 
 )
 
@@ -17,6 +23,12 @@ urlpatterns = [
     path('payment-instruments/', PaymentInstrumentView.as_view(), name='payment-instruments'),
     path('process-id/', ProcessIdView.as_view(), name='process-id'),
     path('notification/', NotificationView.as_view(), name='notification'),
+    path('transaction-status/', TransactionStatusView.as_view(), name='transaction-status'),
+    path('transaction-status/bulk/', BulkTransactionStatusView.as_view(), name='transaction-status-bulk'),
+    path('export/<str:name>/', ExportView.as_view(), name='export'),
+    path('gateway-status/', GatewayStatusView.as_view(), name='gateway-status'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('service-charge/', ServiceChargeView.as_view(), name='service-charge'),
+    path('service-charge/batch/', BatchServiceChargeView.as_view(), name='service-charge-batch'),
 
 ]
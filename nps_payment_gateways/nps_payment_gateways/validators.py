@@ -0,0 +1,208 @@
+"""
+Fast validation of gateway responses.
+
+Each response serializer is compiled once into a tree of plain checker
+functions over bound DRF fields. A checker returns the validated value and its
+representation, so a valid payload yields the same plain dicts as
+``serializer.data`` without instantiating serializers or deep-copying fields
+per request. Common CharField and ChoiceField values are checked inline; every
+other field runs its own ``run_validation``/``to_representation``.
+
+The fast path never reports errors itself. Anything it does not accept outright
+is handed back to the full DRF serializer, so error handling and the accepted
+input set stay exactly those of DRF.
+"""
+import threading
+from collections.abc import Mapping
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import MaxLengthValidator, MinLengthValidator, ProhibitNullCharactersValidator
+from rest_framework import serializers
+from rest_framework.fields import ProhibitSurrogateCharactersValidator, empty
+
+# Validators the inline CharField check reproduces
+_INLINE_CHAR_VALIDATORS = (
+    MaxLengthValidator,
+    MinLengthValidator,
+    ProhibitNullCharactersValidator,
+    ProhibitSurrogateCharactersValidator,
+)
+
+
+class Fallback(Exception):
+    """
+    Raised when the fast path cannot accept a value and full DRF validation must decide
+    """
+
+
+class NotCompilable(Exception):
+    """
+    Raised at compile time for serializer features the fast path does not model
+    """
+
+
+def _compile_generic(field):
+    def check(value):
+        try:
+            internal = field.run_validation(value)
+        except (serializers.ValidationError, DjangoValidationError, serializers.SkipField):
+            raise Fallback
+        return internal, (None if internal is None else field.to_representation(internal))
+    return check
+
+
+def _compile_char(field):
+    generic = _compile_generic(field)
+    trim = field.trim_whitespace
+    allow_blank = field.allow_blank
+    max_length = field.max_length
+    min_length = field.min_length
+
+    def check(value):
+        if type(value) is not str or not value.isascii() or '\x00' in value:
+            return generic(value)
+        internal = value.strip() if trim else value
+        if internal == '':
+            if not allow_blank:
+                raise Fallback
+            return '', ''
+        if (max_length is not None and len(internal) > max_length) or (min_length is not None and len(internal) < min_length):
+            raise Fallback
+        return internal, internal
+    return check
+
+
+def _compile_choice(field):
+    generic = _compile_generic(field)
+    choices = field.choice_strings_to_values
+
+    def check(value):
+        if type(value) is str and value in choices:
+            internal = choices[value]
+            return internal, choices.get(str(internal), internal)
+        return generic(value)
+    return check
+
+
+def _compile_list(field):
+    child = _compile_serializer(field.child)
+    allow_empty = field.allow_empty
+    max_length = field.max_length
+    min_length = field.min_length
+
+    def check(value):
+        if not isinstance(value, list):
+            raise Fallback
+        if (not allow_empty and not value) or (max_length is not None and len(value) > max_length) or (min_length is not None and len(value) < min_length):
+            raise Fallback
+        internal, representation = [], []
+        for item in value:
+            item_internal, item_representation = child(item)
+            internal.append(item_internal)
+            representation.append(item_representation)
+        return internal, representation
+    return check
+
+
+def _compile_field(field):
+    if field.read_only or field.write_only or field.source_attrs != [field.field_name]:
+        raise NotCompilable(field.field_name)
+    if isinstance(field, serializers.ListSerializer):
+        check = _compile_list(field)
+    elif isinstance(field, serializers.Serializer):
+        check = _compile_serializer(field)
+    elif type(field) is serializers.CharField and all(isinstance(v, _INLINE_CHAR_VALIDATORS) for v in field.validators):
+        check = _compile_char(field)
+    elif type(field) is serializers.ChoiceField and not field.validators:
+        check = _compile_choice(field)
+    elif isinstance(field, serializers.Field) and not isinstance(field, (serializers.ListField, serializers.DictField)):
+        check = _compile_generic(field)
+    else:
+        raise NotCompilable(field.field_name)
+
+    allow_null = field.allow_null
+
+    def check_nullable(value):
+        if value is None:
+            if allow_null:
+                return None, None
+            raise Fallback
+        return check(value)
+    return check_nullable
+
+
+def _compile_serializer(serializer):
+    if serializer.get_validators():
+        raise NotCompilable(type(serializer).__name__)
+
+    entries = []
+    for name, field in serializer.fields.items():
+        if hasattr(serializer, f'validate_{name}'):
+            raise NotCompilable(name)
+        entries.append((name, field.required, field.default, field.allow_null, field, _compile_field(field)))
+
+    custom_validate = type(serializer).validate is not serializers.Serializer.validate
+    validate = serializer.validate
+
+    def check(data):
+        if not isinstance(data, Mapping):
+            raise Fallback
+        internal, representation = {}, {}
+        for name, required, default, allow_null, field, check_field in entries:
+            if name in data:
+                internal[name], representation[name] = check_field(data[name])
+            elif required:
+                raise Fallback
+            elif default is not empty:
+                value = field.get_default()
+                internal[name] = value
+                representation[name] = None if value is None else field.to_representation(value)
+            elif allow_null:
+                # DRF renders a missing nullable field as null
+                representation[name] = None
+        if custom_validate:
+            try:
+                if validate(internal) is not internal:
+                    raise Fallback
+            except serializers.ValidationError:
+                raise Fallback
+        return internal, representation
+    return check
+
+
+class CompiledSerializer:
+    """
+    Flat checker for one response serializer class, compiled on first use
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        try:
+            self._check = _compile_serializer(serializer_class())
+        except NotCompilable:
+            self._check = None
+
+    def validate(self, data):
+        """
+        Return the same data as a valid serializer's .data, or None when DRF has to decide
+        """
+        if self._check is None:
+            return None
+        try:
+            return self._check(data)[1]
+        except Fallback:
+            return None
+
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def get_compiled_serializer(serializer_class):
+    compiled = _compiled.get(serializer_class)
+    if compiled is None:
+        with _compiled_lock:
+            compiled = _compiled.get(serializer_class)
+            if compiled is None:
+                compiled = _compiled[serializer_class] = CompiledSerializer(serializer_class)
+    return compiled
@@ -1,12 +1,40 @@
-import hmac
-import hashlib
-import base64
-import requests
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
 from rest_framework import status, viewsets
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from . import metrics
+from .cache import SingleFlight, instrument_cache, invalidate_payment_instruments
+from .charges import service_charge_cache
+from .conf import get_setting
+from .client import (
+    PAYMENT_INSTRUMENT_DETAILS,
+    SERVICE_CHARGE,
+    PROCESS_ID,
+    get_gateway_client,
+)
+from .conditional import compute_etag, conditional_response, get_etag
+from .export import EXPORTS, EXPORT_FORMATS, astream_export, get_export_queryset, stream_export
+from .fastjson import get_parser_classes, get_renderer_classes
+from .ledger import (
+    check_transaction_status,
+    get_issued_transaction,
+    get_terminal_transaction,
+    record_process_id,
+)
+from .merchants import load_merchant_config
 from .models import NpsPayment
+from .notifications import enqueue_notification
+from .polling import get_pending_poller, lookup_pending, track_if_pending
+from .reconcile import astream_ndjson, check_statuses, get_status_rate_limiter, ndjson_lines
+from .resilience import PRIORITY_HIGH, breaker_states
+from .signing import get_signer
 from .serializers import (
     NpsPaymentSerializer,
     PaymentInstrumentRequestSerializer,
@@ -15,31 +43,51 @@ from .serializers import (
     ServiceChargeRequestSerializer,
     PaymentInstrumentResponseSerializer,
     ServiceChargeResponseSerializer,
+    TransactionStatusRequestSerializer,
+    TransactionStatusResponseSerializer,
+    BulkTransactionStatusRequestSerializer,
+    ExportRequestSerializer,
+    validate_gateway_response,
 )
 from rest_framework import serializers
 
+class NpsPaymentPagination(LimitOffsetPagination):
+    """
+    ?limit= and ?offset= paging for npspayment/, keeping data a list in the usual response envelope
+    """
+
+    @property
+    def default_limit(self):
+        return get_setting('NPS_CONFIG_PAGE_SIZE')
+
+    @property
+    def max_limit(self):
+        return get_setting('NPS_CONFIG_MAX_PAGE_SIZE')
+
+    def get_paginated_response(self, data):
+        return Response({
+            "code": "0",
+            "message": "Payment configurations retrieved successfully.",
+            "count": self.count,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "data": data
+        })
+
 class NpsPaymentViewSet(viewsets.ModelViewSet):
-    queryset = NpsPayment.objects.all()
+    queryset = NpsPayment.objects.order_by('pk')
     serializer_class = NpsPaymentSerializer
+    pagination_class = NpsPaymentPagination
     http_method_names = ['get', 'post', 'put', 'patch']
+    renderer_classes = get_renderer_classes()
+    parser_classes = get_parser_classes()
 
     def list(self, request):
-        payments = self.get_queryset()
-        serializer = self.serializer_class(payments, many=True)
-        return Response({
-            "code": "0", 
-            "message": "Payment configurations retrieved successfully.", 
-            "data": serializer.data
-        })
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, *args, **kwargs):
-        if NpsPayment.objects.exists():
-            return Response({
-                "code": "1",
-                "message": "Only one configuration is allowed. Please update the existing one.",
-                "error_code": "400"
-            }, status=status.HTTP_400_BAD_REQUEST)
-
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             self.perform_create(serializer)
@@ -74,31 +122,58 @@ class NpsPaymentViewSet(viewsets.ModelViewSet):
             "errors": serializer.errors
         }, status=status.HTTP_400_BAD_REQUEST)
 
-class NPSBaseAPIView(APIView):
+# HTTP status for gateway errors that are not the client's fault
+GATEWAY_ERROR_STATUS = {
+    "503": status.HTTP_503_SERVICE_UNAVAILABLE,
+    "504": status.HTTP_504_GATEWAY_TIMEOUT,
+}
+
+class NPSGatewayMixin:
+    """
+    Configuration, signing and response handling shared by the sync and async gateway views
+    """
+    # Admission priority of this view's gateway calls; None uses the endpoint's default
+    gateway_priority = None
+    renderer_classes = get_renderer_classes()
+    parser_classes = get_parser_classes()
+
+    def initial(self, request, *args, **kwargs):
+        self.metrics_state = metrics.start_view(self)
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        metrics.finish_view(getattr(self, 'metrics_state', None), response)
+        return response
+
+    def get_merchant_id(self):
+        """
+        Return the merchant named by the NPS_MERCHANT_HEADER header, or by merchant_id in the query string
+        """
+        request = getattr(self, 'request', None)
+        if request is None:
+            return None
+        merchant_id = request.headers.get(get_setting('NPS_MERCHANT_HEADER')) or request.query_params.get('merchant_id')
+        return merchant_id.strip() if merchant_id else None
+
     def get_nps_config(self):
+        """
+        Return the configuration of the requested merchant, or the first one when the request names none
+        """
         try:
-            nps_config = NpsPayment.objects.first()
+            with metrics.phase('config'):
+                nps_config = load_merchant_config(self.get_merchant_id())
             if not nps_config:
                 raise ValueError("NPS configuration is missing.")
             return nps_config
         except Exception as e:
             raise ValueError("Unable to load configuration. Please try again later.")
 
-    def generate_hmac_sha512(self, message, secret_key):
-        try:
-            return hmac.new(secret_key.encode('utf-8'), message.encode('utf-8'), hashlib.sha512).hexdigest().lower()
-        except Exception:
-            raise ValueError("Failed to generate signature.")
+    def get_signer(self, config):
+        return get_signer(config)
 
     def get_headers(self, config):
-        try:
-            auth = f"{config.api_username}:{config.api_password}"
-            return {
-                'Authorization': f'Basic {base64.b64encode(auth.encode()).decode()}',
-                'Content-Type': 'application/json'
-            }
-        except Exception:
-            raise ValueError("Failed to create request headers.")
+        return self.get_signer(config).headers
 
     def get_error_response(self, message, error_code="400", status_code=status.HTTP_400_BAD_REQUEST, errors=None):
         response = {
@@ -128,45 +203,94 @@ class NPSBaseAPIView(APIView):
             response["data"] = data
         return Response(response, status=status.HTTP_202_ACCEPTED)
 
-    def make_api_request(self, url, payload, headers):
-        try:
-            response = requests.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError:
-            return {"code": "1", "message": "Gateway returned an error.", "error_code": "400"}
-        except ValueError:
-            return {"code": "1", "message": "Received an unexpected response from the server.", "error_code": "500"}
-        except Exception:
-            return {"code": "1", "message": "Unable to connect to the payment server.", "error_code": "500"}
+    def validate_response(self, response_data, serializer_class):
+        return validate_gateway_response(response_data, serializer_class)
 
     def handle_response(self, response_data, serializer_class, success_message="Success."):
         if response_data.get('code') == '0':
-            serializer = serializer_class(data=response_data)
-            if serializer.is_valid():
-                return self.get_success_response(success_message, serializer.data)
+            data = self.validate_response(response_data, serializer_class)
+            if data is not None:
+                return self.get_success_response(success_message, data)
             return self.get_error_response("Invalid data format received from payment server.", error_code="500", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
         elif response_data.get('code') == '2':
             return self.get_processing_response("Processing.", response_data.get("data", {}))
+        error_code = response_data.get("error_code", "400")
         return self.get_error_response(
             response_data.get("message", "Unknown error occurred."),
-            error_code=response_data.get("error_code", "400"),
-            status_code=status.HTTP_400_BAD_REQUEST
+            error_code=error_code,
+            status_code=GATEWAY_ERROR_STATUS.get(error_code, status.HTTP_400_BAD_REQUEST)
         )
 
+class NPSBaseAPIView(NPSGatewayMixin, APIView):
+    def make_api_request(self, endpoint, payload, headers):
+        return get_gateway_client().post(endpoint, payload, headers, priority=self.gateway_priority)
+
 class PaymentInstrumentView(NPSBaseAPIView):
+    def get_permissions(self):
+        """
+        Clearing the instrument cache forces a gateway call, so DELETE is limited to staff users
+        """
+        if self.request.method == 'DELETE':
+            return [IsAdminUser()]
+        return super().get_permissions()
+
+    def fetch_payment_instruments(self, signer):
+        payload = signer.build_payload(PAYMENT_INSTRUMENT_DETAILS)
+        response_data = self.make_api_request(PAYMENT_INSTRUMENT_DETAILS, payload, signer.headers)
+        return self.validate_response(response_data, PaymentInstrumentResponseSerializer), response_data
+
+    def get_payment_instruments(self, signer):
+        """
+        Return (validated data, raw response), served from the per-merchant instrument cache
+        """
+        return instrument_cache.get_or_load(
+            signer.merchant_id,
+            lambda: self.fetch_payment_instruments(signer),
+            ttl=get_setting('NPS_INSTRUMENT_CACHE_TTL'),
+            stale_ttl=get_setting('NPS_INSTRUMENT_CACHE_STALE_TTL'),
+        )
+
+    def get_payment_instruments_response(self, data, response_data):
+        if data is not None:
+            return self.get_success_response("Payment instruments retrieved successfully.", data)
+        return self.handle_response(response_data, PaymentInstrumentResponseSerializer, "Payment instruments retrieved successfully.")
+
+    def get_conditional_payment_instruments_response(self, signer, data, response_data):
+        """
+        Response for GET: a success carries an ETag and cache headers, or is 304 when the client already has it
+        """
+        response = self.get_payment_instruments_response(data, response_data)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        media_type = self.request.accepted_media_type or ''
+        etag = get_etag(
+            response.data,
+            media_type,
+            key=('payment_instruments', signer.merchant_id, media_type),
+            source=data,
+            ttl=get_setting('NPS_INSTRUMENT_CACHE_TTL') + get_setting('NPS_INSTRUMENT_CACHE_STALE_TTL'),
+        )
+        return conditional_response(self.request, response, etag, get_setting('NPS_INSTRUMENT_MAX_AGE'), vary=(get_setting('NPS_MERCHANT_HEADER'),))
+
+    def get(self, request):
+        try:
+            serializer = PaymentInstrumentRequestSerializer(data=request.query_params)
+            serializer.is_valid(raise_exception=True)
+            signer = self.get_signer(self.get_nps_config())
+            return self.get_conditional_payment_instruments_response(signer, *self.get_payment_instruments(signer))
+        except serializers.ValidationError as e:
+            return self.get_error_response("Invalid request input.", errors=e.detail)
+        except ValueError as e:
+            return self.get_error_response(str(e), error_code="400")
+        except Exception as e:
+            return self.get_error_response("An unexpected error occurred.", error_code="500", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
     def post(self, request):
         try:
             serializer = PaymentInstrumentRequestSerializer(data=request.data)
             serializer.is_valid(raise_exception=True)
-            config = self.get_nps_config()
-            payload = {
-                "MerchantId": config.merchant_id,
-                "MerchantName": config.merchant_name
-            }
-            payload["Signature"] = self.generate_hmac_sha512(payload["MerchantId"] + payload["MerchantName"], config.gateway_api_secret_key)
-            response_data = self.make_api_request("https://apisandbox.nepalpayment.com/GetPaymentInstrumentDetails", payload, self.get_headers(config))
-            return self.handle_response(response_data, PaymentInstrumentResponseSerializer, "Payment instruments retrieved successfully.")
+            signer = self.get_signer(self.get_nps_config())
+            return self.get_payment_instruments_response(*self.get_payment_instruments(signer))
         except serializers.ValidationError as e:
             return self.get_error_response("Invalid request input.", errors=e.detail)
         except ValueError as e:
@@ -174,22 +298,168 @@ class PaymentInstrumentView(NPSBaseAPIView):
         except Exception as e:
             return self.get_error_response("An unexpected error occurred.", error_code="500", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def delete(self, request):
+        try:
+            config = self.get_nps_config()
+            invalidate_payment_instruments(config.merchant_id)
+            return self.get_success_response("Payment instrument cache cleared.")
+        except ValueError as e:
+            return self.get_error_response(str(e), error_code="400")
+
 class ServiceChargeView(NPSBaseAPIView):
+    def get_service_charge(self, signer, amount, instrument_code):
+        data = service_charge_cache.get(signer.merchant_id, instrument_code, amount)
+        if data is not None:
+            return self.get_success_response("Service charge retrieved successfully.", data)
+        return self.fetch_service_charge(signer, amount, instrument_code)
+
+    def fetch_service_charge(self, signer, amount, instrument_code):
+        payload = signer.build_payload(SERVICE_CHARGE, Amount=amount, InstrumentCode=instrument_code)
+        response_data = self.make_api_request(SERVICE_CHARGE, payload, signer.headers)
+        return self.get_service_charge_response(signer, amount, instrument_code, response_data)
+
+    def get_service_charge_response(self, signer, amount, instrument_code, response_data):
+        data = self.validate_response(response_data, ServiceChargeResponseSerializer)
+        if data is None:
+            return self.handle_response(response_data, ServiceChargeResponseSerializer, "Service charge retrieved successfully.")
+        service_charge_cache.add(signer.merchant_id, instrument_code, amount, data)
+        return self.get_success_response("Service charge retrieved successfully.", data)
+
+    def get_conditional_service_charge_response(self, response):
+        """
+        Response for GET: a quote carries an ETag and cache headers, or is 304 when the client already has it
+        """
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        etag = compute_etag(response.data, self.request.accepted_media_type or '')
+        return conditional_response(self.request, response, etag, get_setting('NPS_SERVICE_CHARGE_MAX_AGE'), vary=(get_setting('NPS_MERCHANT_HEADER'),))
+
+    def get(self, request):
+        try:
+            serializer = ServiceChargeRequestSerializer(data=request.query_params)
+            serializer.is_valid(raise_exception=True)
+            signer = self.get_signer(self.get_nps_config())
+            return self.get_conditional_service_charge_response(self.get_service_charge(
+                signer,
+                str(serializer.validated_data['amount']),
+                serializer.validated_data['payment_instrument_id']
+            ))
+        except serializers.ValidationError as e:
+            return self.get_error_response("Invalid request input.", errors=e.detail)
+        except ValueError as e:
+            return self.get_error_response(str(e), error_code="400")
+        except Exception as e:
+            return self.get_error_response("An unexpected error occurred.", error_code="500", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
     def post(self, request):
         try:
             serializer = ServiceChargeRequestSerializer(data=request.data)
             serializer.is_valid(raise_exception=True)
-            config = self.get_nps_config()
-            payload = {
-                "MerchantId": config.merchant_id,
-                "MerchantName": config.merchant_name,
-                "Amount": str(serializer.validated_data['amount']),
-                "InstrumentCode": serializer.validated_data['payment_instrument_id']
+            signer = self.get_signer(self.get_nps_config())
+            return self.get_service_charge(
+                signer,
+                str(serializer.validated_data['amount']),
+                serializer.validated_data['payment_instrument_id']
+            )
+        except serializers.ValidationError as e:
+            return self.get_error_response("Invalid request input.", errors=e.detail)
+        except ValueError as e:
+            return self.get_error_response(str(e), error_code="400")
+        except Exception as e:
+            return self.get_error_response("An unexpected error occurred.", error_code="500", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
+def get_batch_executor():
+    """
+    Return the process-wide pool that runs batched gateway calls, bounded by NPS_BATCH_WORKERS
+    """
+    global _batch_executor
+    if _batch_executor is None:
+        with _batch_executor_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(
+                    max_workers=get_setting('NPS_BATCH_WORKERS'),
+                    thread_name_prefix='nps-batch'
+                )
+    return _batch_executor
+
+class BatchServiceChargeView(ServiceChargeView):
+    """
+    Service charges for many (amount, instrument) pairs in one request.
+
+    Cached quotes are answered inline; the remaining pairs are quoted by the
+    gateway concurrently. Results keep the order of the request items and carry
+    their own code, message and error_code.
+    """
+    http_method_names = ['post', 'options']
+
+    def get_batch_items(self, request):
+        data = request.data
+        items = data.get('items') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            raise serializers.ValidationError({"items": ["A non-empty list of items is required."]})
+        limit = get_setting('NPS_BATCH_MAX_ITEMS')
+        if len(items) > limit:
+            raise serializers.ValidationError({"items": [f"Ensure this list has no more than {limit} items."]})
+        serializer = ServiceChargeRequestSerializer(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
+        return [(str(item['amount']), item['payment_instrument_id']) for item in serializer.validated_data]
+
+    def get_batch_item_result(self, signer, amount, instrument_code):
+        try:
+            response = self.fetch_service_charge(signer, amount, instrument_code)
+        except ValueError as e:
+            response = self.get_error_response(str(e), error_code="400")
+        except Exception:
+            response = self.get_error_response("An unexpected error occurred.", error_code="500", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return response.data
+
+    def get_cached_batch_results(self, signer, pairs):
+        """
+        Return ({pair: result} for cached quotes, [distinct pairs the gateway must quote])
+        """
+        results, pending = {}, []
+        for pair in dict.fromkeys(pairs):
+            data = service_charge_cache.get(signer.merchant_id, pair[1], pair[0])
+            if data is not None:
+                results[pair] = self.get_success_response("Service charge retrieved successfully.", data).data
+            else:
+                pending.append(pair)
+        return results, pending
+
+    def get_batch_results(self, signer, pairs):
+        """
+        Return {(amount, instrument_code): result} for the distinct pairs
+        """
+        results, pending = self.get_cached_batch_results(signer, pairs)
+        if len(pending) == 1:
+            results[pending[0]] = self.get_batch_item_result(signer, *pending[0])
+        elif pending:
+            executor = get_batch_executor()
+            futures = {
+                pair: executor.submit(contextvars.copy_context().run, self.get_batch_item_result, signer, *pair)
+                for pair in pending
             }
-            signature_str = f"{payload['Amount']}{payload['MerchantId']}{payload['MerchantName']}{payload['InstrumentCode']}"
-            payload["Signature"] = self.generate_hmac_sha512(signature_str, config.gateway_api_secret_key)
-            response_data = self.make_api_request("https://apisandbox.nepalpayment.com/GetServiceCharge", payload, self.get_headers(config))
-            return self.handle_response(response_data, ServiceChargeResponseSerializer, "Service charge retrieved successfully.")
+            for pair, future in futures.items():
+                results[pair] = future.result()
+        return results
+
+    def get_batch_response(self, pairs, results):
+        return self.get_success_response(
+            "Service charges retrieved successfully.",
+            [
+                {"amount": amount, "payment_instrument_id": instrument_code, **results[(amount, instrument_code)]}
+                for amount, instrument_code in pairs
+            ]
+        )
+
+    def post(self, request):
+        try:
+            pairs = self.get_batch_items(request)
+            signer = self.get_signer(self.get_nps_config())
+            return self.get_batch_response(pairs, self.get_batch_results(signer, pairs))
         except serializers.ValidationError as e:
             return self.get_error_response("Invalid request input.", errors=e.detail)
         except ValueError as e:
@@ -197,50 +467,114 @@ class ServiceChargeView(NPSBaseAPIView):
         except Exception as e:
             return self.get_error_response("An unexpected error occurred.", error_code="500", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# Concurrent GetProcessId calls for the same (merchant_id, merchant_txn_id)
+process_id_flights = SingleFlight()
+
+# Conflict message for a merchant_txn_id reused with different request details
+PROCESS_ID_MISMATCH = "Merchant transaction ID was already used with a different amount, remarks or instrument."
+
 class ProcessIdView(NPSBaseAPIView):
+    def request_process_id(self, signer, payload, transaction_remarks, instrument_code):
+        """
+        Return (gateway response, ledger row); the row is None unless a ProcessId was issued
+        """
+        response_data = self.make_api_request(PROCESS_ID, payload, signer.headers)
+        transaction = None
+        if response_data.get('code') == '0':
+            transaction = record_process_id(
+                signer.merchant_id, payload, response_data["data"]["ProcessId"], transaction_remarks, instrument_code,
+                window=get_setting('NPS_PROCESS_ID_IDEMPOTENCY_WINDOW')
+            )
+        return response_data, transaction
+
+    def get_conflict_response(self, message):
+        return self.get_error_response(message, error_code="409", status_code=status.HTTP_409_CONFLICT)
+
+    def get_issued_process_id_response(self, transaction, payload, transaction_remarks, instrument_code):
+        """
+        Answer a repeated request from the ledger instead of asking the gateway for another ProcessId
+        """
+        if transaction.is_terminal:
+            return self.get_conflict_response("Transaction has already been processed.")
+        if (
+            transaction.amount != Decimal(payload["Amount"])
+            or transaction.transaction_remarks != (transaction_remarks or '')
+            or transaction.instrument_code != (instrument_code or '')
+        ):
+            return self.get_conflict_response(PROCESS_ID_MISMATCH)
+        return self.get_process_id_response(payload, {"code": "0", "data": {"ProcessId": transaction.process_id}}, transaction_remarks, instrument_code)
+
+    def get_requested_process_id_response(self, payload, response_data, transaction, transaction_remarks, instrument_code):
+        """
+        Build the response for a ProcessId just requested, deferring to one another process recorded first
+        """
+        if transaction is not None and transaction.process_id != response_data["data"]["ProcessId"]:
+            return self.get_issued_process_id_response(transaction, payload, transaction_remarks, instrument_code)
+        return self.get_process_id_response(payload, response_data, transaction_remarks, instrument_code)
+
+    def get_process_id_response(self, payload, response_data, transaction_remarks, instrument_code):
+        if response_data.get('code') == '0':
+            return self.get_success_response(
+                "Process ID retrieved successfully.",
+                {
+                    "MerchantId": payload["MerchantId"],
+                    "MerchantName": payload["MerchantName"],
+                    "Amount": payload["Amount"],
+                    "MerchantTxnId": payload["MerchantTxnId"],
+                    "Signature": payload["Signature"],
+                    "TransactionRemarks": transaction_remarks,
+                    "InstrumentCode": instrument_code,
+                    "ProcessId": response_data["data"]["ProcessId"]
+                }
+            )
+        error_code = response_data.get("error_code", "400")
+        return self.get_error_response(
+            response_data.get("message", "Could not retrieve process ID."),
+            error_code=error_code,
+            status_code=GATEWAY_ERROR_STATUS.get(error_code, status.HTTP_400_BAD_REQUEST),
+            errors=response_data.get("errors", [])
+        )
+
+    def get_shared_process_id_response(self, result, payload, transaction_remarks, instrument_code):
+        """
+        Build the response for a caller that joined an in-flight GetProcessId call
+        """
+        flight_payload, flight_remarks, flight_instrument_code, (response_data, transaction) = result
+        if (
+            flight_payload["Amount"] != payload["Amount"]
+            or (flight_remarks or '') != (transaction_remarks or '')
+            or (flight_instrument_code or '') != (instrument_code or '')
+        ):
+            return self.get_conflict_response(PROCESS_ID_MISMATCH)
+        return self.get_requested_process_id_response(payload, response_data, transaction, transaction_remarks, instrument_code)
+
     def post(self, request):
         try:
             serializer = ProcessIdRequestSerializer(data=request.data)
             serializer.is_valid(raise_exception=True)
             TransactionRemarks = request.data.get('TransactionRemarks')
             InstrumentCode = request.data.get('InstrumentCode') 
-            config = self.get_nps_config()
-            payload = {
-                "MerchantId": config.merchant_id,
-                "MerchantName": config.merchant_name,
-                "Amount": str(serializer.validated_data['amount']),
-                "MerchantTxnId": serializer.validated_data['merchant_txn_id']
-            }
+            signer = self.get_signer(self.get_nps_config())
+            payload = signer.build_payload(
+                PROCESS_ID,
+                Amount=str(serializer.validated_data['amount']),
+                MerchantTxnId=serializer.validated_data['merchant_txn_id']
+            )
 
-            signature_str = f"{payload['Amount']}{payload['MerchantId']}{payload['MerchantName']}{payload['MerchantTxnId']}"
-            payload["Signature"] = self.generate_hmac_sha512(signature_str, config.gateway_api_secret_key)
+            window = get_setting('NPS_PROCESS_ID_IDEMPOTENCY_WINDOW')
+            if not window:
+                response_data, _ = self.request_process_id(signer, payload, TransactionRemarks, InstrumentCode)
+                return self.get_process_id_response(payload, response_data, TransactionRemarks, InstrumentCode)
 
-            response_data = self.make_api_request(
-                "https://apisandbox.nepalpayment.com/GetProcessId",
-                payload,
-                self.get_headers(config)
-            )
+            transaction = get_issued_transaction(signer.merchant_id, payload["MerchantTxnId"], window)
+            if transaction is not None:
+                return self.get_issued_process_id_response(transaction, payload, TransactionRemarks, InstrumentCode)
 
-            if response_data.get('code') == '0':
-                return self.get_success_response(
-                    "Process ID retrieved successfully.",
-                    {
-                        "MerchantId": payload["MerchantId"],
-                        "MerchantName": payload["MerchantName"],
-                        "Amount": payload["Amount"],
-                        "MerchantTxnId": payload["MerchantTxnId"],
-                        "Signature": payload["Signature"],
-                        "TransactionRemarks":TransactionRemarks,
-                        "InstrumentCode":InstrumentCode,
-                        "ProcessId": response_data["data"]["ProcessId"]
-                    }
-                )
-            else:
-                return self.get_error_response(
-                    response_data.get("message", "Could not retrieve process ID."),
-                    error_code=response_data.get("error_code", "400"),
-                    errors=response_data.get("errors", [])
-                )
+            result = process_id_flights.do(
+                (signer.merchant_id, payload["MerchantTxnId"]),
+                lambda: (payload, TransactionRemarks, InstrumentCode, self.request_process_id(signer, payload, TransactionRemarks, InstrumentCode))
+            )
+            return self.get_shared_process_id_response(result, payload, TransactionRemarks, InstrumentCode)
 
         except serializers.ValidationError as e:
             return self.get_error_response("Invalid request input.", errors=e.detail)
@@ -254,28 +588,28 @@ class ProcessIdView(NPSBaseAPIView):
             )
 
 class NotificationView(NPSBaseAPIView):
+    # Payment confirmations are checked ahead of lookups and bulk status checks
+    gateway_priority = PRIORITY_HIGH
+
     def post(self, request):
         try:
             serializer = NotificationRequestSerializer(data=request.data)
             serializer.is_valid(raise_exception=True)
             merchant_txn_id = serializer.validated_data['merchant_txn_id']
-            config = self.get_nps_config()
+            signer = self.get_signer(self.get_nps_config())
 
-            payload = {
-                "MerchantId": config.merchant_id,
-                "MerchantName": config.merchant_name,
-                "MerchantTxnId": merchant_txn_id
-            }
-            payload["Signature"] = self.generate_hmac_sha512(
-                f"{payload['MerchantId']}{payload['MerchantName']}{payload['MerchantTxnId']}",
-                config.gateway_api_secret_key
-            )
+            if get_setting('NPS_NOTIFICATION_MODE') == 'deferred':
+                # Acknowledge at once; nps_notification_worker runs the status check
+                enqueue_notification(signer.merchant_id, merchant_txn_id, serializer.validated_data['gateway_txn_id'])
+                return self.get_success_response("Notification received.")
 
-            response_data = self.make_api_request(
-                "https://apisandbox.nepalpayment.com/CheckTransactionStatus",
-                payload,
-                self.get_headers(config)
+            data, response_data = check_transaction_status(
+                signer,
+                merchant_txn_id,
+                serializer.validated_data['gateway_txn_id'],
+                post=self.make_api_request
             )
+            track_if_pending(signer.merchant_id, merchant_txn_id, data, response_data, serializer.validated_data['gateway_txn_id'])
 
             # Just return the raw response data from the API
             return Response(response_data)
@@ -290,3 +624,160 @@ class NotificationView(NPSBaseAPIView):
                 error_code="500",
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+class TransactionStatusView(NPSBaseAPIView):
+    """
+    Transaction status lookup; Success and Fail results are answered from the ledger without calling the gateway
+    """
+    def lookup(self, data):
+        try:
+            serializer = TransactionStatusRequestSerializer(data=data)
+            serializer.is_valid(raise_exception=True)
+            merchant_txn_id = serializer.validated_data['merchant_txn_id']
+            signer = self.get_signer(self.get_nps_config())
+
+            transaction = get_terminal_transaction(signer.merchant_id, merchant_txn_id)
+            if transaction is not None:
+                return self.get_success_response("Transaction status retrieved successfully.", transaction.status_response)
+
+            # A transaction the poller is following is answered with its last check
+            response_data = lookup_pending(signer.merchant_id, merchant_txn_id)
+            if response_data is not None:
+                return self.handle_response(response_data, TransactionStatusResponseSerializer, "Transaction status retrieved successfully.")
+
+            data, response_data = check_transaction_status(signer, merchant_txn_id, post=self.make_api_request)
+            track_if_pending(signer.merchant_id, merchant_txn_id, data, response_data)
+            if data is not None:
+                return self.get_success_response("Transaction status retrieved successfully.", data)
+            return self.handle_response(response_data, TransactionStatusResponseSerializer, "Transaction status retrieved successfully.")
+        except serializers.ValidationError as e:
+            return self.get_error_response("Invalid request input.", errors=e.detail)
+        except ValueError as e:
+            return self.get_error_response(str(e), error_code="400")
+        except Exception as e:
+            return self.get_error_response(
+                "An unexpected error occurred.",
+                error_code="500",
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    def get(self, request):
+        return self.lookup(request.query_params)
+
+    def post(self, request):
+        return self.lookup(request.data)
+
+class BulkTransactionStatusView(NPSBaseAPIView):
+    """
+    Status of many transactions, streamed as NDJSON lines in the order the checks finish.
+
+    Takes {"merchant_txn_ids": [...]} or an uploaded file with one merchant_txn_id per line.
+    Limited to staff users, since one request makes many signed gateway calls.
+    """
+    permission_classes = [IsAdminUser]
+    # Set by async_urls, so ASGI servers send each result as it finishes instead of buffering them
+    async_streaming = False
+
+    def get_merchant_txn_ids(self, request):
+        upload = request.FILES.get('file')
+        if upload is not None:
+            ids = [line.strip() for line in upload.read().decode('utf-8-sig').splitlines() if line.strip()]
+            data = {"merchant_txn_ids": ids}
+        else:
+            data = request.data
+        serializer = BulkTransactionStatusRequestSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['merchant_txn_ids']
+
+    def post(self, request):
+        try:
+            merchant_txn_ids = self.get_merchant_txn_ids(request)
+            signer = self.get_signer(self.get_nps_config())
+            results = check_statuses(
+                signer,
+                merchant_txn_ids,
+                workers=get_setting('NPS_BULK_STATUS_WORKERS'),
+                limiter=get_status_rate_limiter()
+            )
+            if self.async_streaming:
+                lines = astream_ndjson(results)
+            else:
+                lines = ndjson_lines(results)
+            return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+        except serializers.ValidationError as e:
+            return self.get_error_response("Invalid request input.", errors=e.detail)
+        except UnicodeDecodeError:
+            return self.get_error_response("The file must be UTF-8 text.", error_code="400")
+        except ValueError as e:
+            return self.get_error_response(str(e), error_code="400")
+        except Exception as e:
+            return self.get_error_response(
+                "An unexpected error occurred.",
+                error_code="500",
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class ExportView(NPSBaseAPIView):
+    """
+    Transactions or notifications streamed as NDJSON or CSV in id order.
+
+    Limited to staff users and to one merchant, named like any other request's; filters on
+    status and created_from/created_to; pass the id of the last row received as after to
+    resume an interrupted export.
+    """
+    permission_classes = [IsAdminUser]
+    # Set by async_urls, so ASGI servers stream the export instead of buffering it
+    async_streaming = False
+
+    def get(self, request, name):
+        try:
+            if name not in EXPORTS:
+                return self.get_error_response("Unknown export.", error_code="404", status_code=status.HTTP_404_NOT_FOUND)
+            serializer = ExportRequestSerializer(data=request.query_params)
+            serializer.is_valid(raise_exception=True)
+            params = serializer.validated_data
+            merchant_id = self.get_merchant_id()
+            if not merchant_id:
+                return self.get_error_response("Invalid request input.", errors={"merchant_id": ["This field is required."]})
+            export_format = params['export_format']
+            queryset = get_export_queryset(
+                name,
+                merchant_id=merchant_id,
+                status=params.get('status'),
+                created_from=params.get('created_from'),
+                created_to=params.get('created_to'),
+                after=params.get('after'),
+            )
+            chunks = stream_export(name, export_format, queryset, get_setting('NPS_EXPORT_CHUNK_SIZE'))
+            if self.async_streaming:
+                chunks = astream_export(chunks)
+            response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[export_format])
+            response['Content-Disposition'] = f'attachment; filename="nps-{name}.{export_format}"'
+            return response
+        except serializers.ValidationError as e:
+            return self.get_error_response("Invalid request input.", errors=e.detail)
+        except Exception as e:
+            return self.get_error_response(
+                "An unexpected error occurred.",
+                error_code="500",
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class GatewayStatusView(NPSBaseAPIView):
+    """
+    Circuit breaker state per gateway endpoint, for monitoring
+    """
+    def get(self, request):
+        data = {"breakers": breaker_states()}
+        if get_setting('NPS_PENDING_POLLING'):
+            data["pending_polling"] = get_pending_poller().snapshot()
+        return self.get_success_response("Gateway status retrieved successfully.", data)
+
+class MetricsView(NPSBaseAPIView):
+    """
+    Gateway view metrics in the Prometheus text format, available when NPS_METRICS_ENABLED is set
+    """
+    def get(self, request):
+        if not metrics.enabled():
+            return self.get_error_response("Metrics are disabled.", error_code="404", status_code=status.HTTP_404_NOT_FOUND)
+        return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
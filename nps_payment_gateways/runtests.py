@@ -0,0 +1,30 @@
+"""
+Run the app's tests against an in-memory SQLite database.
+
+    cd nps_payment_gateways
+    python runtests.py                                     # every test
+    python runtests.py nps_payment_gateways.tests.test_process_id
+"""
+import sys
+
+import django
+from django.conf import settings
+from django.test.utils import get_runner
+
+
+def main(labels):
+    settings.configure(
+        SECRET_KEY='tests',
+        USE_TZ=True,
+        INSTALLED_APPS=['django.contrib.contenttypes', 'django.contrib.auth', 'rest_framework', 'nps_payment_gateways'],
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+        ROOT_URLCONF='nps_payment_gateways.urls',
+        NPS_BASE_URL='http://nps.invalid',
+    )
+    django.setup()
+    runner = get_runner(settings)()
+    return runner.run_tests(labels or ['nps_payment_gateways'])
+
+
+if __name__ == '__main__':
+    sys.exit(bool(main(sys.argv[1:])))
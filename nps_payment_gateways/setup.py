@@ -9,6 +9,10 @@ setup(
         'Django>=4.2.7',
         'djangorestframework'
     ],
+    extras_require={
+        'async': ['adrf', 'httpx'],
+        'fast': ['orjson'],
+    },
     classifiers=[
         'Framework :: Django',
         'Programming Language :: Python :: 3',